@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Content-addressed artifact store for videos, segments and derivatives
+Every file is kept once under blobs/ by its sha256, and named outputs are
+materialized from it as reflinks (copy-on-write clones) where the filesystem
+supports them, otherwise as hardlinks, otherwise as copies. refs.json records
+which outputs point at which blob, so blobs nothing uses any more can be
+pruned once they are older than the retention period.
+
+Usage:
+  python artifact_store.py put FILE...          store files and link them back
+  python artifact_store.py dedupe DIR...        store every file under DIR (e.g. segments)
+  python artifact_store.py materialize DIGEST DEST
+  python artifact_store.py prune [--max-age-days N] [--dry-run]
+  python artifact_store.py du                   logical vs stored size
+
+The store lives in ./artifacts unless VIDEO_ARTIFACT_STORE or --store says
+otherwise; VIDEO_ARTIFACT_LINK forces reflink, hardlink or copy.
+"""
+
+import argparse
+import errno
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+import video_segments
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+DEFAULT_STORE_DIR = os.environ.get('VIDEO_ARTIFACT_STORE', 'artifacts')
+LINK_MODES = ['auto', 'reflink', 'hardlink', 'copy']
+DEFAULT_MAX_AGE_DAYS = 30
+# ioctl request for cloning a whole file (Linux, btrfs/XFS/bcachefs)
+FICLONE = 0x40049409
+
+_refs_lock = threading.Lock()
+
+def blob_path(digest, store_dir=DEFAULT_STORE_DIR):
+    return os.path.join(store_dir, 'blobs', digest[:2], digest)
+
+def refs_path(store_dir=DEFAULT_STORE_DIR):
+    return os.path.join(store_dir, 'refs.json')
+
+def load_refs(store_dir=DEFAULT_STORE_DIR):
+    try:
+        with open(refs_path(store_dir)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_refs(refs, store_dir=DEFAULT_STORE_DIR):
+    """Write the reference index atomically"""
+    tmp_file = refs_path(store_dir) + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(refs, f, indent=1, sort_keys=True)
+    os.replace(tmp_file, refs_path(store_dir))
+
+def _reflink(src, dst):
+    """Clone src to dst without copying data; raises OSError where unsupported"""
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflinks need Linux")
+    with open(src, 'rb') as source, open(dst, 'wb') as target:
+        fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+
+def link_file(src, dst, mode=None):
+    """Materialize src at dst as a reflink, hardlink or copy; returns the method used"""
+    mode = mode or os.environ.get('VIDEO_ARTIFACT_LINK', 'auto')
+    if mode not in LINK_MODES:
+        raise ValueError(f"Unknown link mode: {mode}")
+    tmp_file = video_segments.temp_path(dst)
+    methods = [('reflink', _reflink), ('hardlink', os.link), ('copy', shutil.copyfile)]
+    if mode != 'auto':
+        methods = [m for m in methods if m[0] == mode]
+    for name, method in methods:
+        try:
+            method(src, tmp_file)
+        except OSError:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            if mode != 'auto':
+                raise
+            continue
+        os.replace(tmp_file, dst)
+        return name
+    raise OSError(f"Cannot materialize {src} at {dst}")
+
+def add_blob(path, store_dir=DEFAULT_STORE_DIR):
+    """Store a file's content once and return its digest"""
+    digest = video_segments.file_digest(path)
+    blob = blob_path(digest, store_dir)
+    if not os.path.exists(blob):
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        tmp_file = video_segments.temp_path(blob)
+        # Never hardlink here: the blob gets its own inode, so the mode change
+        # below does not touch the caller's file
+        try:
+            _reflink(path, tmp_file)
+        except OSError:
+            shutil.copyfile(path, tmp_file)
+        # Read-only, so a writer that ignores release() fails instead of corrupting the blob
+        os.chmod(tmp_file, 0o444)
+        os.replace(tmp_file, blob)
+    return digest
+
+def _record(refs, path, digest):
+    st = os.stat(path)
+    refs[os.path.abspath(path)] = {'digest': digest, 'time': time.time(),
+                                   'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+def put(paths, store_dir=DEFAULT_STORE_DIR, mode=None):
+    """Store files and replace each with a link to its blob; returns {path: digest}
+
+    An output that ends up hardlinked shares the blob's read-only mode until
+    release() unlinks it.
+    """
+    digests = {}
+    for path in paths:
+        digest = add_blob(path, store_dir)
+        blob = blob_path(digest, store_dir)
+        if not os.path.samefile(path, blob):
+            link_file(blob, path, mode)
+        digests[path] = digest
+    with _refs_lock:
+        refs = load_refs(store_dir)
+        for path, digest in digests.items():
+            _record(refs, path, digest)
+        save_refs(refs, store_dir)
+    return digests
+
+def is_sidecar(path):
+    """Content hash sidecars are rewritten in place on every run, so they are never stored"""
+    return path.endswith('.sha256')
+
+def store_output(path, store_dir=DEFAULT_STORE_DIR, mode=None):
+    """Store a finished output: a video file or every file of an output directory"""
+    if os.path.isdir(path):
+        files = [os.path.join(root, name) for root, _, names in os.walk(path) for name in sorted(names)
+                 if not is_sidecar(name)]
+    else:
+        files = [path]
+    return put(files, store_dir, mode)
+
+def materialize(digest, dest, store_dir=DEFAULT_STORE_DIR, mode=None):
+    """Create a named output from a stored blob; returns the method used"""
+    blob = blob_path(digest, store_dir)
+    if not os.path.exists(blob):
+        raise FileNotFoundError(f"No blob {digest} in {store_dir}")
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+    method = link_file(blob, dest, mode)
+    with _refs_lock:
+        refs = load_refs(store_dir)
+        _record(refs, dest, digest)
+        save_refs(refs, store_dir)
+    return method
+
+def release(path, store_dir=DEFAULT_STORE_DIR):
+    """Unlink an output that shares its inode with a blob before it is rewritten in place
+
+    ffmpeg -y truncates and rewrites an existing output, which would also
+    overwrite the blob through a hardlink. Only files that are the blob their
+    ref points at are removed; other hardlinks the user made are left alone.
+    """
+    refs = load_refs(store_dir)
+    if os.path.isdir(path):
+        files = [os.path.join(root, name) for root, _, names in os.walk(path) for name in names]
+    else:
+        files = [path]
+    for file_path in files:
+        ref = refs.get(os.path.abspath(file_path))
+        if not ref or is_sidecar(file_path) or not os.path.isfile(file_path):
+            continue
+        blob = blob_path(ref['digest'], store_dir)
+        if os.path.exists(blob) and os.path.samefile(file_path, blob):
+            os.remove(file_path)
+
+def _is_live(path, ref, store_dir):
+    """Whether a named output still holds the content its ref recorded"""
+    if not os.path.isfile(path):
+        return False
+    blob = blob_path(ref['digest'], store_dir)
+    if os.path.exists(blob) and os.path.samefile(path, blob):
+        return True
+    st = os.stat(path)
+    return st.st_size == ref['size'] and st.st_mtime_ns == ref['mtime_ns']
+
+def prune(max_age_days=DEFAULT_MAX_AGE_DAYS, store_dir=DEFAULT_STORE_DIR, dry_run=False):
+    """Delete blobs no live output has referenced for max_age_days; returns bytes freed"""
+    cutoff = time.time() - max_age_days * 86400
+    with _refs_lock:
+        refs = load_refs(store_dir)
+        last_used = {}
+        for path, ref in list(refs.items()):
+            if _is_live(path, ref, store_dir):
+                ref['time'] = time.time()
+            elif ref['time'] < cutoff:
+                del refs[path]
+                continue
+            last_used[ref['digest']] = max(last_used.get(ref['digest'], 0), ref['time'])
+
+        freed = 0
+        blobs_dir = os.path.join(store_dir, 'blobs')
+        for root, _, names in os.walk(blobs_dir):
+            for digest in names:
+                blob = os.path.join(root, digest)
+                # Unreferenced blobs are judged by when they were stored
+                if last_used.get(digest, os.path.getmtime(blob)) >= cutoff:
+                    continue
+                freed += os.path.getsize(blob)
+                print(f"{'Would remove' if dry_run else 'Removing'} {digest[:16]} "
+                      f"({os.path.getsize(blob) / 1024 / 1024:.2f} MB)")
+                if not dry_run:
+                    os.remove(blob)
+        if not dry_run:
+            save_refs(refs, store_dir)
+    return freed
+
+def disk_usage(store_dir=DEFAULT_STORE_DIR):
+    """Return (logical bytes of all live outputs, bytes held in blobs)"""
+    refs = load_refs(store_dir)
+    logical = sum(ref['size'] for path, ref in refs.items() if _is_live(path, ref, store_dir))
+    stored = sum(os.path.getsize(os.path.join(root, name))
+                 for root, _, names in os.walk(os.path.join(store_dir, 'blobs')) for name in names)
+    return logical, stored
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help=f"store directory (default: {DEFAULT_STORE_DIR})")
+    parser.add_argument('--link', choices=LINK_MODES, help="how outputs are materialized (default: auto)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('put').add_argument('files', nargs='+')
+    commands.add_parser('dedupe').add_argument('dirs', nargs='+')
+    materialize_parser = commands.add_parser('materialize')
+    materialize_parser.add_argument('digest')
+    materialize_parser.add_argument('dest')
+    prune_parser = commands.add_parser('prune')
+    prune_parser.add_argument('--max-age-days', type=float, default=DEFAULT_MAX_AGE_DAYS)
+    prune_parser.add_argument('--dry-run', action='store_true')
+    commands.add_parser('du')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    os.makedirs(args.store, exist_ok=True)
+    try:
+        if args.command == 'put':
+            for path, digest in put(args.files, args.store, args.link).items():
+                print(f"{digest}  {path}")
+        elif args.command == 'dedupe':
+            # Cache entries are replaced, never rewritten in place, so hardlinking them is safe
+            digests = {}
+            for directory in args.dirs:
+                digests.update(store_output(directory, args.store, args.link))
+            print(f"{len(digests)} file(s), {len(set(digests.values()))} unique")
+        elif args.command == 'materialize':
+            print(f"{args.dest}: {materialize(args.digest, args.dest, args.store, args.link)}")
+        elif args.command == 'prune':
+            freed = prune(args.max_age_days, args.store, args.dry_run)
+            print(f"{'Would free' if args.dry_run else 'Freed'} {freed / 1024 / 1024:.2f} MB")
+        elif args.command == 'du':
+            logical, stored = disk_usage(args.store)
+            print(f"Outputs: {logical / 1024 / 1024:.2f} MB, stored: {stored / 1024 / 1024:.2f} MB")
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark intermediate frame formats on our slide sizes
+Renders a text slide and a screenshot overlay in every format and reports
+the ffmpeg CPU time to write and decode each one against its size on disk
+"""
+
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import frame_formats
+import slide_images
+import slide_renderer
+
+ROUNDS = 5
+SAMPLE_LINES = ["AndroidManifest.xml Declaration",
+                "Permission declaration:",
+                "Service must specify foregroundServiceType='dataSync'",
+                "Both are required for Android 14+ compatibility"]
+SAMPLE_SCREENSHOT = 'screenshot_backup_03_notification.png'
+
+def child_cpu_time():
+    """CPU seconds used so far by finished child processes"""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def decode_frame(frame_file):
+    """Decode a frame the way the encoder would, discarding the pixels"""
+    cmd = ['ffmpeg', '-v', 'error', '-i', frame_file, '-f', 'null', '-']
+    subprocess.run(cmd, check=True, capture_output=True)
+
+def benchmark_format(name, work_dir):
+    """Return (write_cpu, decode_cpu, total_bytes) per round, or None if ffmpeg cannot write the format"""
+    frame_formats.select(name)
+    ext = frame_formats.extension()
+    text_frame = os.path.join(work_dir, f'text_{name}{ext}')
+    overlay_frame = os.path.join(work_dir, f'overlay_{name}{ext}')
+
+    start = child_cpu_time()
+    for _ in range(ROUNDS):
+        slide_images.create_text_slide(SAMPLE_LINES, text_frame)
+        if os.path.exists(SAMPLE_SCREENSHOT):
+            slide_images.add_text_overlay_to_image(SAMPLE_SCREENSHOT, SAMPLE_LINES, overlay_frame)
+        # Slides may only be queued for the batch backend
+        slide_renderer.flush()
+    write_cpu = (child_cpu_time() - start) / ROUNDS
+    if not os.path.exists(text_frame):
+        return None
+
+    frames = [f for f in (text_frame, overlay_frame) if os.path.exists(f)]
+    start = child_cpu_time()
+    for _ in range(ROUNDS):
+        for frame_file in frames:
+            decode_frame(frame_file)
+    decode_cpu = (child_cpu_time() - start) / ROUNDS
+
+    return write_cpu, decode_cpu, sum(os.path.getsize(f) for f in frames)
+
+def main():
+    if not slide_images.check_ffmpeg():
+        print("Error: ffmpeg not found. Please install ffmpeg first.")
+        sys.exit(1)
+
+    work_dir = tempfile.mkdtemp(prefix='frame_formats_')
+    print(f"Benchmarking frame formats ({ROUNDS} rounds, text slide + screenshot overlay)\n")
+    print(f"{'format':<8}{'write cpu':>12}{'decode cpu':>12}{'total cpu':>12}{'size':>12}")
+    try:
+        for name in frame_formats.FRAME_FORMATS:
+            result = benchmark_format(name, work_dir)
+            if result is None:
+                print(f"{name:<8}  unsupported by this ffmpeg build")
+                continue
+            write_cpu, decode_cpu, size = result
+            print(f"{name:<8}{write_cpu * 1000:>10.0f}ms{decode_cpu * 1000:>10.0f}ms"
+                  f"{(write_cpu + decode_cpu) * 1000:>10.0f}ms{size / 1024:>10.0f}KB")
+    finally:
+        shutil.rmtree(work_dir)
+
+if __name__ == '__main__':
+    main()
@@ -4,107 +4,93 @@ Create a demonstration video showing FOREGROUND_SERVICE_DATA_SYNC in action
 Uses screenshots from emulator with text overlays explaining the service
 """
 
-import subprocess
+import argparse
 import os
 import sys
 
-def check_ffmpeg():
-    """Check if ffmpeg is available"""
-    try:
-        result = subprocess.run(['ffmpeg', '-version'], 
-                              capture_output=True, text=True)
-        return result.returncode == 0
-    except FileNotFoundError:
-        return False
+import artifact_store
+import frame_formats
+import frame_store
+import resource_governor
+import slide_images
+import slide_renderer
+import video_budget
+import video_determinism
+import video_narration
+import video_previews
+import video_segments
+import video_subtitles
+import video_transitions
+
+# Text lines of every slide created, by output file, for narration
+slide_lines = {}
+# Overlay arguments of soft-captioned screenshots, by output file, for --burned-copy
+burn_overlays = {}
+
+STYLE = slide_images.BACKUP_STYLE
 
-def add_text_overlay_to_image(input_image, text_lines, output_file, 
+def add_text_overlay_to_image(input_image, text_lines, output_file,
                               text_color='white', title_size=50, subtitle_size=30,
-                              position='bottom'):
-    """Add text overlay to an existing screenshot"""
-    if not os.path.exists(input_image):
-        print(f"Warning: Input image not found: {input_image}")
-        return False
-    
-    drawtext_filters = []
-    
-    if position == 'bottom':
-        # Calculate starting Y position from bottom
-        y_start = 900  # Start near bottom
-        y_offset = y_start
-    else:
-        # Top position
-        y_offset = 50
-    
-    for i, line in enumerate(text_lines):
-        # Escape single quotes and special characters for drawtext
-        escaped_text = line.replace("'", "\\'").replace(":", "\\:")
-        if i == 0:
-            # Title - larger, bold
-            drawtext_filters.append(
-                f"drawtext=text='{escaped_text}':fontsize={title_size}:fontcolor={text_color}:"
-                f"x=(w-text_w)/2:y={y_offset}:"
-                f"box=1:boxcolor=0x000000@0.8:boxborderw=10"
-            )
-            y_offset += title_size + 20
-        else:
-            # Subtitle - smaller
-            drawtext_filters.append(
-                f"drawtext=text='{escaped_text}':fontsize={subtitle_size}:fontcolor=#4CAF50:"
-                f"x=(w-text_w)/2:y={y_offset}:"
-                f"box=1:boxcolor=0x000000@0.7:boxborderw=5"
-            )
-            y_offset += subtitle_size + 15
-    
-    vf_filter = ','.join(drawtext_filters)
-    
-    cmd = [
-        'ffmpeg',
-        '-y',
-        '-i', input_image,
-        '-vf', vf_filter,
-        output_file
-    ]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        print(f"Error adding text overlay: {result.stderr}")
-        return False
-    return True
+                              position='bottom', captions=None):
+    """Add text overlay to an existing screenshot, remembering its lines for narration"""
+    if os.path.exists(input_image):
+        slide_lines[output_file] = list(text_lines)
+        if captions is not None:
+            burn_overlays[output_file] = (input_image, list(text_lines), text_color, title_size, subtitle_size,
+                                          position)
+    return slide_images.add_text_overlay_to_image(input_image, text_lines, output_file, text_color,
+                                                  title_size, subtitle_size, position, captions, STYLE)
 
-def create_text_slide(text_lines, output_file, width=1920, height=1080, 
+def create_text_slide(text_lines, output_file, width=1920, height=1080,
                      bg_color='0x1a1a1a', text_color='white', title_size=60, subtitle_size=40):
-    """Create an image with multiple lines of text using ffmpeg"""
-    drawtext_filters = []
-    y_offset = 300
-    
-    for i, line in enumerate(text_lines):
-        # Escape single quotes and special characters for drawtext
-        escaped_text = line.replace("'", "\\'").replace(":", "\\:")
-        if i == 0:
-            drawtext_filters.append(
-                f"drawtext=text='{escaped_text}':fontsize={title_size}:fontcolor={text_color}:x=(w-text_w)/2:y={y_offset}"
-            )
-            y_offset += title_size + 20
-        else:
-            drawtext_filters.append(
-                f"drawtext=text='{escaped_text}':fontsize={subtitle_size}:fontcolor=#4CAF50:x=(w-text_w)/2:y={y_offset}"
-            )
-            y_offset += subtitle_size + 15
-    
-    vf_filter = ','.join(drawtext_filters)
-    
-    cmd = [
-        'ffmpeg',
-        '-y',
-        '-f', 'lavfi',
-        '-i', f'color=c={bg_color}:s={width}x{1080}:d=1',
-        '-vf', vf_filter,
-        '-frames:v', '1',
-        output_file
-    ]
-    subprocess.run(cmd, check=True, capture_output=True)
+    """Create a text slide, remembering its lines for narration"""
+    slide_lines[output_file] = list(text_lines)
+    return slide_images.create_text_slide(text_lines, output_file, width, height, bg_color, text_color,
+                                          title_size, subtitle_size, STYLE)
+
+def burned_jobs():
+    """Jobs drawing each soft-captioned screenshot's overlay exactly as burn mode would
+
+    Raises ValueError if a screenshot cannot be measured.
+    """
+    jobs = {}
+    for output_file, (input_image, text_lines, *options) in burn_overlays.items():
+        burned_file = os.path.join('frames', 'burned', os.path.basename(output_file))
+        jobs[output_file] = slide_images.overlay_job(input_image, text_lines, burned_file, *options, style=STYLE)
+    return jobs
 
-def create_video_from_images(image_files, output_video, fps=1, duration=6):
+def create_video_from_images(image_files, output_video, fps=1, duration=6, output_format='mp4',
+                             captions=None, transition=None, transition_duration=1.0, crf=None,
+                             store_path=None):
     """Create video from sequence of images"""
+    if captions:
+        # Encode the visuals once, then attach the caption lines as a subtitle track
+        if not create_video_from_images(image_files, output_video, fps, duration, output_format,
+                                        transition=transition,
+                                        transition_duration=transition_duration, crf=crf,
+                                        store_path=store_path):
+            return False
+        cues = video_subtitles.build_cues(image_files, captions, duration)
+        if output_format == 'hls':
+            return video_subtitles.add_hls_subtitles(output_video, cues, duration)
+        extra_args = ['-movflags', video_segments.FRAGMENTED_MOVFLAGS] if output_format == 'fmp4' else []
+        return video_subtitles.add_soft_subtitles(output_video, cues, extra_args=extra_args)
+
+    if output_format == 'hls':
+        return video_segments.create_hls_stream(image_files, output_video, fps, duration)
+    if output_format == 'fmp4':
+        return video_segments.create_fragmented_mp4(image_files, output_video, fps, duration)
+    if transition:
+        return video_transitions.create_video_with_transitions(
+            image_files, output_video, [transition] * len(image_files),
+            fps=max(fps, video_transitions.TRANSITION_FPS), duration=duration,
+            window=transition_duration)
+
+    if store_path:
+        return frame_store.create_video_from_store(
+            image_files, output_video, store_path, fps, duration,
+            extra_args=['-crf', str(crf)] if crf is not None else [])
+
     # Filter out non-existent files
     existing_files = [f for f in image_files if os.path.exists(f)]
     
@@ -132,9 +118,12 @@ def create_video_from_images(image_files, output_video, fps=1, duration=6):
         '-pix_fmt', 'yuv420p',
         '-c:v', 'libx264',
         '-preset', 'medium',
+        *(['-crf', str(crf)] if crf is not None else []),
+        *video_determinism.encoder_args(),
+        *video_determinism.muxer_args(),
         output_video
     ]
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    result = resource_governor.run(cmd, capture_output=True, text=True)
     if result.returncode != 0:
         print(f"FFmpeg error: {result.stderr}")
         if os.path.exists('image_list.txt'):
@@ -145,8 +134,71 @@ def create_video_from_images(image_files, output_video, fps=1, duration=6):
         os.remove('image_list.txt')
     return True
 
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--format', choices=['mp4', 'fmp4', 'hls'], default='mp4',
+                        help="mp4: single file; fmp4: fragmented MP4 written per slide; "
+                             "hls: per-slide segments with a live-updated playlist")
+    parser.add_argument('--captions', choices=['burn', 'soft'], default='burn',
+                        help="burn: draw overlay text into screenshots; "
+                             "soft: keep screenshots clean and add a WebVTT/mov_text track")
+    parser.add_argument('--burned-copy', metavar='PATH',
+                        help="with --captions soft, also write a variant with the overlays "
+                             "drawn as --captions burn would draw them")
+    parser.add_argument('--transition', choices=video_transitions.TRANSITIONS,
+                        help="transition between slides (mp4 only); only the boundary "
+                             "windows are re-encoded when it changes")
+    parser.add_argument('--transition-duration', type=float, default=1.0, metavar='SECONDS',
+                        help="length of each transition window (default: 1.0)")
+    parser.add_argument('--frame-format', choices=sorted(frame_formats.FRAME_FORMATS),
+                        default=frame_formats.DEFAULT_FRAME_FORMAT,
+                        help="format of the intermediate slides in frames/ "
+                             f"(default: {frame_formats.DEFAULT_FRAME_FORMAT}, PNG without compression)")
+    parser.add_argument('--deterministic', action='store_true',
+                        help="produce byte-identical output for identical decks and record "
+                             "its content hash next to the output")
+    parser.add_argument('--frame-store', metavar='PATH',
+                        help="keep decoded slides in a memory-mapped frame store at PATH and "
+                             "stream them to the encoder, so unchanged slides are never decoded again")
+    parser.add_argument('--narration', action='store_true',
+                        help="add a spoken track of each slide's text, synthesized offline with espeak-ng")
+    parser.add_argument('--voice', default=video_narration.DEFAULT_VOICE,
+                        help=f"espeak-ng voice for --narration (default: {video_narration.DEFAULT_VOICE})")
+    parser.add_argument('--previews', action='store_true',
+                        help="also publish a poster, per-slide thumbnails and a seek-preview "
+                             "sprite sheet with its WebVTT index next to the video")
+    parser.add_argument('--artifact-store', nargs='?', const=artifact_store.DEFAULT_STORE_DIR, metavar='DIR',
+                        help="keep the outputs once by content in an artifact store and leave links "
+                             f"to them in place (default DIR: {artifact_store.DEFAULT_STORE_DIR})")
+    resource_governor.add_arguments(parser)
+    budget = parser.add_mutually_exclusive_group()
+    budget.add_argument('--target-size', metavar='SIZE',
+                        help="pick the CRF that fits the video in SIZE bytes (e.g. 5M)")
+    budget.add_argument('--target-bitrate', metavar='RATE',
+                        help="pick the CRF that fits an average bitrate in bits/s (e.g. 400k)")
+    args = parser.parse_args()
+    if args.narration and args.format == 'hls':
+        parser.error("narration needs a single-file output, not hls")
+    if args.transition and args.format != 'mp4':
+        parser.error("transitions apply to the single-file mp4 output, not fmp4 or hls")
+    if args.frame_store and (args.format != 'mp4' or args.transition):
+        parser.error("the frame store applies to the single-file mp4 encode without transitions")
+    if (args.target_size or args.target_bitrate) and (args.format != 'mp4' or args.transition):
+        parser.error("size budgets apply to the single-file mp4 encode without transitions")
+    if args.burned_copy and args.captions != 'soft':
+        parser.error("--burned-copy needs --captions soft")
+    return args
+
 def main():
-    if not check_ffmpeg():
+    args = parse_args()
+    resource_governor.configure(args)
+    frame_formats.select(args.frame_format)
+    ext = frame_formats.extension()
+    if args.deterministic:
+        video_determinism.enable()
+
+    if not slide_images.check_ffmpeg():
         print("Error: ffmpeg not found. Please install ffmpeg first.")
         print("Download from: https://ffmpeg.org/download.html")
         sys.exit(1)
@@ -158,14 +210,15 @@ def main():
     os.makedirs('frames', exist_ok=True)
     
     image_files = []
+    captions = {} if args.captions == 'soft' else None
     
     # Slide 1: Title
     print("Creating slide 1: Title...")
     create_text_slide(
         ["FOREGROUND_SERVICE_DATA_SYNC", "Backup Restore Demonstration", "QKSMS Messenger"],
-        'frames/slide_01_title.png'
+        f'frames/slide_01_title{ext}'
     )
-    image_files.append('frames/slide_01_title.png')
+    image_files.append(f'frames/slide_01_title{ext}')
     
     # Slide 2: Introduction
     print("Creating slide 2: Introduction...")
@@ -174,9 +227,9 @@ def main():
          "How backup restore uses foreground service",
          "Why FOREGROUND_SERVICE_DATA_SYNC is needed",
          "Service runs even when app is backgrounded"],
-        'frames/slide_02_intro.png'
+        f'frames/slide_02_intro{ext}'
     )
-    image_files.append('frames/slide_02_intro.png')
+    image_files.append(f'frames/slide_02_intro{ext}')
     
     # Slide 3: Backup screen screenshot with overlay
     screenshot1 = 'screenshot_backup_01_main.png'
@@ -187,19 +240,20 @@ def main():
             ["Backup & Restore Screen",
              "Tap 'Restore' to start RestoreBackupService",
              "Service will run as foreground service with dataSync type"],
-            'frames/slide_03_backup_screen.png',
-            position='bottom'
+            f'frames/slide_03_backup_screen{ext}',
+            position='bottom',
+            captions=captions
         )
-        image_files.append('frames/slide_03_backup_screen.png')
+        image_files.append(f'frames/slide_03_backup_screen{ext}')
     else:
         print(f"Warning: {screenshot1} not found, creating text slide...")
         create_text_slide(
             ["Backup & Restore Screen",
              "Navigate to: Drawer Menu -> Backup",
              "This screen allows restoring messages from backup"],
-            'frames/slide_03_backup_screen.png'
+            f'frames/slide_03_backup_screen{ext}'
         )
-        image_files.append('frames/slide_03_backup_screen.png')
+        image_files.append(f'frames/slide_03_backup_screen{ext}')
     
     # Slide 4: Restore clicked
     screenshot2 = 'screenshot_backup_02_restore_clicked.png'
@@ -211,19 +265,20 @@ def main():
              "RestoreBackupService.start() is called",
              "Service becomes foreground service immediately",
              "Shows notification to user"],
-            'frames/slide_04_restore_started.png',
-            position='bottom'
+            f'frames/slide_04_restore_started{ext}',
+            position='bottom',
+            captions=captions
         )
-        image_files.append('frames/slide_04_restore_started.png')
+        image_files.append(f'frames/slide_04_restore_started{ext}')
     else:
         print(f"Warning: {screenshot2} not found...")
         create_text_slide(
             ["Restore Operation Started",
              "User selects backup file and confirms",
              "RestoreBackupService.start() is called"],
-            'frames/slide_04_restore_started.png'
+            f'frames/slide_04_restore_started{ext}'
         )
-        image_files.append('frames/slide_04_restore_started.png')
+        image_files.append(f'frames/slide_04_restore_started{ext}')
     
     # Slide 5: Service running explanation
     print("Creating slide 5: Service running...")
@@ -232,9 +287,9 @@ def main():
          "RestoreBackupService uses startForeground()",
          "Shows persistent notification with progress",
          "FOREGROUND_SERVICE_DATA_SYNC permission required"],
-        'frames/slide_05_service_running.png'
+        f'frames/slide_05_service_running{ext}'
     )
-    image_files.append('frames/slide_05_service_running.png')
+    image_files.append(f'frames/slide_05_service_running{ext}')
     
     # Slide 6: Notification screenshot
     screenshot3 = 'screenshot_backup_03_notification.png'
@@ -246,19 +301,20 @@ def main():
              "Service continues running in background",
              "User can switch apps - restore continues",
              "Permission enables this background operation"],
-            'frames/slide_06_notification.png',
-            position='bottom'
+            f'frames/slide_06_notification{ext}',
+            position='bottom',
+            captions=captions
         )
-        image_files.append('frames/slide_06_notification.png')
+        image_files.append(f'frames/slide_06_notification{ext}')
     else:
         print(f"Warning: {screenshot3} not found...")
         create_text_slide(
             ["Foreground Service Notification",
              "Persistent notification shows restore progress",
              "Service continues even when app is closed"],
-            'frames/slide_06_notification.png'
+            f'frames/slide_06_notification{ext}'
         )
-        image_files.append('frames/slide_06_notification.png')
+        image_files.append(f'frames/slide_06_notification{ext}')
     
     # Slide 7: Code explanation - Manifest
     print("Creating slide 7: Manifest declaration...")
@@ -267,9 +323,9 @@ def main():
          "Permission: FOREGROUND_SERVICE_DATA_SYNC",
          "Service: foregroundServiceType='dataSync'",
          "Both required for Android 14+ compatibility"],
-        'frames/slide_07_manifest.png'
+        f'frames/slide_07_manifest{ext}'
     )
-    image_files.append('frames/slide_07_manifest.png')
+    image_files.append(f'frames/slide_07_manifest{ext}')
     
     # Slide 8: Code explanation - Service
     print("Creating slide 8: Service code...")
@@ -278,9 +334,9 @@ def main():
          "startForeground() - becomes foreground service",
          "dataSync type - indicates data synchronization",
          "Permission auto-granted when service starts"],
-        'frames/slide_08_service_code.png'
+        f'frames/slide_08_service_code{ext}'
     )
-    image_files.append('frames/slide_08_service_code.png')
+    image_files.append(f'frames/slide_08_service_code{ext}')
     
     # Slide 9: Why it matters
     print("Creating slide 9: Why it matters...")
@@ -289,9 +345,9 @@ def main():
          "Without it: Restore fails on Android 14+",
          "With it: Reliable backup restore works",
          "User experience: Seamless background operations"],
-        'frames/slide_09_why_matters.png'
+        f'frames/slide_09_why_matters{ext}'
     )
-    image_files.append('frames/slide_09_why_matters.png')
+    image_files.append(f'frames/slide_09_why_matters{ext}')
     
     # Slide 10: Summary
     print("Creating slide 10: Summary...")
@@ -300,19 +356,92 @@ def main():
          "FOREGROUND_SERVICE_DATA_SYNC enables",
          "reliable backup restore on Android 14+",
          "Essential for background data operations"],
-        'frames/slide_10_summary.png'
+        f'frames/slide_10_summary{ext}'
     )
-    image_files.append('frames/slide_10_summary.png')
+    image_files.append(f'frames/slide_10_summary{ext}')
     
     # Create video
-    output_video = '../FOREGROUND_SERVICE_DATA_SYNC_DEMO.mp4'
+    if args.format == 'hls':
+        output_video = '../FOREGROUND_SERVICE_DATA_SYNC_DEMO_hls'
+    else:
+        output_video = '../FOREGROUND_SERVICE_DATA_SYNC_DEMO.mp4'
+    if not slide_renderer.flush():
+        print("\n[ERROR] Failed to render slides")
+        sys.exit(1)
     print(f"\nCreating video: {output_video}")
-    if create_video_from_images(image_files, output_video, fps=1, duration=6):
+    outputs = [output_video, video_previews.previews_dir_for(output_video), args.burned_copy]
+    # Outputs linked to stored blobs by an earlier run must not be rewritten in place
+    for path in filter(None, outputs):
+        artifact_store.release(path, args.artifact_store or artifact_store.DEFAULT_STORE_DIR)
+    crf = None
+    if args.target_size or args.target_bitrate:
+        target_bytes = video_budget.budget_bytes(len(image_files) * 6, args.target_size,
+                                                 args.target_bitrate)
+        # The narration track is added after the video encode, so the video gets what it leaves
+        audio_bytes = video_narration.audio_bytes(len(image_files) * 6) if args.narration else 0
+        if audio_bytes >= target_bytes:
+            print("\n[ERROR] The size budget does not cover the narration track")
+            sys.exit(1)
+        print("Searching CRF for size budget on sampled slides...")
+        crf, predicted_bytes = video_budget.choose_crf(image_files, target_bytes - audio_bytes, fps=1,
+                                                       duration=6)
+        if crf is None:
+            print("\n[ERROR] Failed to sample slides for size budget")
+            sys.exit(1)
+        predicted_bytes += audio_bytes
+        print(f"Using CRF {crf} (predicted {predicted_bytes / 1024 / 1024:.2f} MB)")
+    if create_video_from_images(image_files, output_video, fps=1, duration=6,
+                                output_format=args.format, captions=captions,
+                                transition=args.transition,
+                                transition_duration=args.transition_duration, crf=crf,
+                                store_path=args.frame_store):
+        if args.narration:
+            print(f"\nAdding narration (voice: {args.voice})...")
+            slide_texts = [video_narration.narration_text(slide_lines.get(img, []))
+                           for img in image_files if os.path.exists(img)]
+            extra_args = ['-movflags', video_segments.FRAGMENTED_MOVFLAGS] if args.format == 'fmp4' else []
+            if not video_narration.add_narration(output_video, slide_texts, duration=6,
+                                                 voice=args.voice, extra_args=extra_args):
+                print("\n[ERROR] Failed to add narration")
+                sys.exit(1)
         if os.path.exists(output_video):
-            file_size = os.path.getsize(output_video)
+            if os.path.isdir(output_video):
+                file_size = sum(e.stat().st_size for e in os.scandir(output_video))
+            else:
+                file_size = os.path.getsize(output_video)
             print(f"\n[SUCCESS] Video created successfully: {output_video}")
             print(f"Video size: {file_size / 1024 / 1024:.2f} MB")
             print(f"Duration: ~{len(image_files) * 6} seconds")
+            if args.deterministic:
+                digest, changed = video_determinism.record_content_hash(output_video)
+                status = "changed, publish" if changed else "unchanged since last build, skip publishing"
+                print(f"Content hash: {digest} ({status})")
+            if crf is not None:
+                video_budget.report(predicted_bytes, output_video, target_bytes)
+            if args.previews:
+                previews_dir = video_previews.previews_dir_for(output_video)
+                print(f"\nCreating previews: {previews_dir}")
+                if video_previews.create_previews(image_files, previews_dir, duration=6) is None:
+                    print("\n[ERROR] Failed to create previews")
+                    sys.exit(1)
+            if args.burned_copy:
+                print(f"\nCreating burned-in variant: {args.burned_copy}")
+                try:
+                    ok = video_subtitles.create_burned_video(image_files, args.burned_copy, burned_jobs(),
+                                                             fps=1, duration=6)
+                except ValueError as e:
+                    print(f"Error: {e}")
+                    ok = False
+                if not ok:
+                    print("\n[ERROR] Failed to create burned-in variant")
+                    sys.exit(1)
+            if args.artifact_store:
+                stored = {}
+                for path in filter(None, outputs):
+                    if os.path.exists(path):
+                        stored.update(artifact_store.store_output(path, args.artifact_store))
+                print(f"Stored {len(stored)} file(s) in {args.artifact_store} "
+                      f"({len(set(stored.values()))} unique)")
         else:
             print("\n[ERROR] Video file not created")
             sys.exit(1)
@@ -4,111 +4,93 @@ Create a comprehensive demonstration video showing FOREGROUND_SERVICE_DATA_SYNC
 Uses screenshots from emulator with detailed text overlays explaining everything
 """
 
-import subprocess
+import argparse
 import os
 import sys
 
-def check_ffmpeg():
-    """Check if ffmpeg is available"""
-    try:
-        result = subprocess.run(['ffmpeg', '-version'], 
-                              capture_output=True, text=True)
-        return result.returncode == 0
-    except FileNotFoundError:
-        return False
+import artifact_store
+import frame_formats
+import frame_store
+import resource_governor
+import slide_images
+import slide_renderer
+import video_budget
+import video_determinism
+import video_narration
+import video_previews
+import video_segments
+import video_subtitles
+import video_transitions
+
+# Text lines of every slide created, by output file, for narration
+slide_lines = {}
+# Overlay arguments of soft-captioned screenshots, by output file, for --burned-copy
+burn_overlays = {}
+
+STYLE = slide_images.COMPREHENSIVE_STYLE
 
-def add_text_overlay_to_image(input_image, text_lines, output_file, 
+def add_text_overlay_to_image(input_image, text_lines, output_file,
                               text_color='white', title_size=60, subtitle_size=35,
-                              position='bottom'):
-    """Add text overlay to an existing screenshot"""
-    if not os.path.exists(input_image):
-        print(f"Warning: Input image not found: {input_image}")
-        return False
-    
-    drawtext_filters = []
-    
-    if position == 'bottom':
-        # Calculate starting Y position from bottom
-        y_start = 850  # Start near bottom
-        y_offset = y_start
-    else:
-        # Top position
-        y_offset = 80
-    
-    for i, line in enumerate(text_lines):
-        # Escape single quotes and special characters for drawtext
-        escaped_text = line.replace("'", "\\'").replace(":", "\\:").replace("=", "\\=")
-        if i == 0:
-            # Title - larger, bold
-            drawtext_filters.append(
-                f"drawtext=text='{escaped_text}':fontsize={title_size}:fontcolor={text_color}:"
-                f"x=(w-text_w)/2:y={y_offset}:"
-                f"box=1:boxcolor=0x000000@0.85:boxborderw=15"
-            )
-            y_offset += title_size + 25
-        else:
-            # Subtitle - smaller
-            drawtext_filters.append(
-                f"drawtext=text='{escaped_text}':fontsize={subtitle_size}:fontcolor=#4CAF50:"
-                f"x=(w-text_w)/2:y={y_offset}:"
-                f"box=1:boxcolor=0x000000@0.75:boxborderw=8"
-            )
-            y_offset += subtitle_size + 18
-    
-    vf_filter = ','.join(drawtext_filters)
-    
-    cmd = [
-        'ffmpeg',
-        '-y',
-        '-i', input_image,
-        '-vf', vf_filter,
-        output_file
-    ]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        print(f"Error adding text overlay: {result.stderr}")
-        return False
-    return True
+                              position='bottom', captions=None):
+    """Add text overlay to an existing screenshot, remembering its lines for narration"""
+    if os.path.exists(input_image):
+        slide_lines[output_file] = list(text_lines)
+        if captions is not None:
+            burn_overlays[output_file] = (input_image, list(text_lines), text_color, title_size, subtitle_size,
+                                          position)
+    return slide_images.add_text_overlay_to_image(input_image, text_lines, output_file, text_color,
+                                                  title_size, subtitle_size, position, captions, STYLE)
 
-def create_text_slide(text_lines, output_file, width=1920, height=1080, 
+def create_text_slide(text_lines, output_file, width=1920, height=1080,
                      bg_color='0x1a1a1a', text_color='white', title_size=70, subtitle_size=45):
-    """Create an image with multiple lines of text using ffmpeg"""
-    drawtext_filters = []
-    y_offset = 250
-    
-    for i, line in enumerate(text_lines):
-        # Escape single quotes and special characters for drawtext
-        escaped_text = line.replace("'", "\\'").replace(":", "\\:").replace("=", "\\=")
-        if i == 0:
-            drawtext_filters.append(
-                f"drawtext=text='{escaped_text}':fontsize={title_size}:fontcolor={text_color}:x=(w-text_w)/2:y={y_offset}"
-            )
-            y_offset += title_size + 30
-        else:
-            drawtext_filters.append(
-                f"drawtext=text='{escaped_text}':fontsize={subtitle_size}:fontcolor=#4CAF50:x=(w-text_w)/2:y={y_offset}"
-            )
-            y_offset += subtitle_size + 20
-    
-    vf_filter = ','.join(drawtext_filters)
-    
-    cmd = [
-        'ffmpeg',
-        '-y',
-        '-f', 'lavfi',
-        '-i', f'color=c={bg_color}:s={width}x{1080}:d=1',
-        '-vf', vf_filter,
-        '-frames:v', '1',
-        output_file
-    ]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        print(f"Error creating text slide: {result.stderr}")
-        return False
-    return True
+    """Create a text slide, remembering its lines for narration"""
+    slide_lines[output_file] = list(text_lines)
+    return slide_images.create_text_slide(text_lines, output_file, width, height, bg_color, text_color,
+                                          title_size, subtitle_size, STYLE)
+
+def burned_jobs():
+    """Jobs drawing each soft-captioned screenshot's overlay exactly as burn mode would
 
-def create_video_from_images(image_files, output_video, fps=1, duration=8):
+    Raises ValueError if a screenshot cannot be measured.
+    """
+    jobs = {}
+    for output_file, (input_image, text_lines, *options) in burn_overlays.items():
+        burned_file = os.path.join('frames', 'burned', os.path.basename(output_file))
+        jobs[output_file] = slide_images.overlay_job(input_image, text_lines, burned_file, *options, style=STYLE)
+    return jobs
+
+def create_video_from_images(image_files, output_video, fps=1, duration=8, output_format='mp4',
+                             captions=None, transition=None, transition_duration=1.0, crf=None,
+                             store_path=None):
     """Create video from sequence of images"""
+    if captions:
+        # Encode the visuals once, then attach the caption lines as a subtitle track
+        if not create_video_from_images(image_files, output_video, fps, duration, output_format,
+                                        transition=transition,
+                                        transition_duration=transition_duration, crf=crf,
+                                        store_path=store_path):
+            return False
+        cues = video_subtitles.build_cues(image_files, captions, duration)
+        if output_format == 'hls':
+            return video_subtitles.add_hls_subtitles(output_video, cues, duration)
+        extra_args = ['-movflags', video_segments.FRAGMENTED_MOVFLAGS] if output_format == 'fmp4' else []
+        return video_subtitles.add_soft_subtitles(output_video, cues, extra_args=extra_args)
+
+    if output_format == 'hls':
+        return video_segments.create_hls_stream(image_files, output_video, fps, duration)
+    if output_format == 'fmp4':
+        return video_segments.create_fragmented_mp4(image_files, output_video, fps, duration)
+    if transition:
+        return video_transitions.create_video_with_transitions(
+            image_files, output_video, [transition] * len(image_files),
+            fps=max(fps, video_transitions.TRANSITION_FPS), duration=duration,
+            window=transition_duration)
+
+    if store_path:
+        return frame_store.create_video_from_store(
+            image_files, output_video, store_path, fps, duration,
+            extra_args=['-crf', str(crf)] if crf is not None else [])
+
     # Filter out non-existent files
     existing_files = [f for f in image_files if os.path.exists(f)]
     
@@ -136,9 +118,12 @@ def create_video_from_images(image_files, output_video, fps=1, duration=8):
         '-pix_fmt', 'yuv420p',
         '-c:v', 'libx264',
         '-preset', 'medium',
+        *(['-crf', str(crf)] if crf is not None else []),
+        *video_determinism.encoder_args(),
+        *video_determinism.muxer_args(),
         output_video
     ]
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    result = resource_governor.run(cmd, capture_output=True, text=True)
     if result.returncode != 0:
         print(f"FFmpeg error: {result.stderr}")
         if os.path.exists('image_list.txt'):
@@ -149,8 +134,71 @@ def create_video_from_images(image_files, output_video, fps=1, duration=8):
         os.remove('image_list.txt')
     return True
 
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--format', choices=['mp4', 'fmp4', 'hls'], default='mp4',
+                        help="mp4: single file; fmp4: fragmented MP4 written per slide; "
+                             "hls: per-slide segments with a live-updated playlist")
+    parser.add_argument('--captions', choices=['burn', 'soft'], default='burn',
+                        help="burn: draw overlay text into screenshots; "
+                             "soft: keep screenshots clean and add a WebVTT/mov_text track")
+    parser.add_argument('--burned-copy', metavar='PATH',
+                        help="with --captions soft, also write a variant with the overlays "
+                             "drawn as --captions burn would draw them")
+    parser.add_argument('--transition', choices=video_transitions.TRANSITIONS,
+                        help="transition between slides (mp4 only); only the boundary "
+                             "windows are re-encoded when it changes")
+    parser.add_argument('--transition-duration', type=float, default=1.0, metavar='SECONDS',
+                        help="length of each transition window (default: 1.0)")
+    parser.add_argument('--frame-format', choices=sorted(frame_formats.FRAME_FORMATS),
+                        default=frame_formats.DEFAULT_FRAME_FORMAT,
+                        help="format of the intermediate slides in frames/ "
+                             f"(default: {frame_formats.DEFAULT_FRAME_FORMAT}, PNG without compression)")
+    parser.add_argument('--deterministic', action='store_true',
+                        help="produce byte-identical output for identical decks and record "
+                             "its content hash next to the output")
+    parser.add_argument('--frame-store', metavar='PATH',
+                        help="keep decoded slides in a memory-mapped frame store at PATH and "
+                             "stream them to the encoder, so unchanged slides are never decoded again")
+    parser.add_argument('--narration', action='store_true',
+                        help="add a spoken track of each slide's text, synthesized offline with espeak-ng")
+    parser.add_argument('--voice', default=video_narration.DEFAULT_VOICE,
+                        help=f"espeak-ng voice for --narration (default: {video_narration.DEFAULT_VOICE})")
+    parser.add_argument('--previews', action='store_true',
+                        help="also publish a poster, per-slide thumbnails and a seek-preview "
+                             "sprite sheet with its WebVTT index next to the video")
+    parser.add_argument('--artifact-store', nargs='?', const=artifact_store.DEFAULT_STORE_DIR, metavar='DIR',
+                        help="keep the outputs once by content in an artifact store and leave links "
+                             f"to them in place (default DIR: {artifact_store.DEFAULT_STORE_DIR})")
+    resource_governor.add_arguments(parser)
+    budget = parser.add_mutually_exclusive_group()
+    budget.add_argument('--target-size', metavar='SIZE',
+                        help="pick the CRF that fits the video in SIZE bytes (e.g. 5M)")
+    budget.add_argument('--target-bitrate', metavar='RATE',
+                        help="pick the CRF that fits an average bitrate in bits/s (e.g. 400k)")
+    args = parser.parse_args()
+    if args.narration and args.format == 'hls':
+        parser.error("narration needs a single-file output, not hls")
+    if args.transition and args.format != 'mp4':
+        parser.error("transitions apply to the single-file mp4 output, not fmp4 or hls")
+    if args.frame_store and (args.format != 'mp4' or args.transition):
+        parser.error("the frame store applies to the single-file mp4 encode without transitions")
+    if (args.target_size or args.target_bitrate) and (args.format != 'mp4' or args.transition):
+        parser.error("size budgets apply to the single-file mp4 encode without transitions")
+    if args.burned_copy and args.captions != 'soft':
+        parser.error("--burned-copy needs --captions soft")
+    return args
+
 def main():
-    if not check_ffmpeg():
+    args = parse_args()
+    resource_governor.configure(args)
+    frame_formats.select(args.frame_format)
+    ext = frame_formats.extension()
+    if args.deterministic:
+        video_determinism.enable()
+
+    if not slide_images.check_ffmpeg():
         print("Error: ffmpeg not found. Please install ffmpeg first.")
         print("Download from: https://ffmpeg.org/download.html")
         sys.exit(1)
@@ -162,14 +210,15 @@ def main():
     os.makedirs('frames', exist_ok=True)
     
     image_files = []
+    captions = {} if args.captions == 'soft' else None
     
     # Slide 1: Title
     print("Creating slide 1: Title...")
     create_text_slide(
         ["FOREGROUND_SERVICE_DATA_SYNC", "Complete Demonstration", "QKSMS Messenger - Backup Restore Feature"],
-        'frames/slide_01_title.png'
+        f'frames/slide_01_title{ext}'
     )
-    image_files.append('frames/slide_01_title.png')
+    image_files.append(f'frames/slide_01_title{ext}')
     
     # Slide 2: What is FOREGROUND_SERVICE_DATA_SYNC
     print("Creating slide 2: What is the permission...")
@@ -179,9 +228,9 @@ def main():
          "Needed when using foreground services for data synchronization",
          "Must be declared in AndroidManifest.xml",
          "Service must specify foregroundServiceType='dataSync'"],
-        'frames/slide_02_what_is_permission.png'
+        f'frames/slide_02_what_is_permission{ext}'
     )
-    image_files.append('frames/slide_02_what_is_permission.png')
+    image_files.append(f'frames/slide_02_what_is_permission{ext}')
     
     # Slide 3: Why we need it
     print("Creating slide 3: Why we need it...")
@@ -192,9 +241,9 @@ def main():
          "This is classified as 'data sync' operation",
          "Without permission: Service fails on Android 14+",
          "With permission: Reliable backup restore works"],
-        'frames/slide_03_why_need.png'
+        f'frames/slide_03_why_need{ext}'
     )
-    image_files.append('frames/slide_03_why_need.png')
+    image_files.append(f'frames/slide_03_why_need{ext}')
     
     # Slide 4: Main menu screenshot with overlay
     screenshot_main = 'screenshot_main_menu.png'
@@ -206,19 +255,20 @@ def main():
              "Navigate to Backup & Restore",
              "Tap the menu drawer (hamburger icon)",
              "Then select 'Backup' option"],
-            'frames/slide_04_main_menu.png',
-            position='bottom'
+            f'frames/slide_04_main_menu{ext}',
+            position='bottom',
+            captions=captions
         )
-        image_files.append('frames/slide_04_main_menu.png')
+        image_files.append(f'frames/slide_04_main_menu{ext}')
     else:
         print(f"Warning: {screenshot_main} not found, creating text slide...")
         create_text_slide(
             ["Main Menu",
              "Navigate to: Menu Drawer -> Backup",
              "This is where users access backup features"],
-            'frames/slide_04_main_menu.png'
+            f'frames/slide_04_main_menu{ext}'
         )
-        image_files.append('frames/slide_04_main_menu.png')
+        image_files.append(f'frames/slide_04_main_menu{ext}')
     
     # Slide 5: Drawer menu screenshot
     screenshot_drawer = 'screenshot_drawer.png'
@@ -230,19 +280,20 @@ def main():
              "Shows all app features and settings",
              "Tap 'Backup' to access backup & restore",
              "This is the entry point for restore operations"],
-            'frames/slide_05_drawer.png',
-            position='bottom'
+            f'frames/slide_05_drawer{ext}',
+            position='bottom',
+            captions=captions
         )
-        image_files.append('frames/slide_05_drawer.png')
+        image_files.append(f'frames/slide_05_drawer{ext}')
     else:
         print(f"Warning: {screenshot_drawer} not found...")
         create_text_slide(
             ["Navigation Drawer",
              "Shows app menu options",
              "Select 'Backup' to continue"],
-            'frames/slide_05_drawer.png'
+            f'frames/slide_05_drawer{ext}'
         )
-        image_files.append('frames/slide_05_drawer.png')
+        image_files.append(f'frames/slide_05_drawer{ext}')
     
     # Slide 6: Backup screen screenshot
     screenshot_backup = 'screenshot_backup_screen.png'
@@ -256,19 +307,20 @@ def main():
              "RestoreBackupService.start() is called",
              "Service immediately becomes foreground service",
              "Shows persistent notification with progress"],
-            'frames/slide_06_backup_screen.png',
-            position='bottom'
+            f'frames/slide_06_backup_screen{ext}',
+            position='bottom',
+            captions=captions
         )
-        image_files.append('frames/slide_06_backup_screen.png')
+        image_files.append(f'frames/slide_06_backup_screen{ext}')
     else:
         print(f"Warning: {screenshot_backup} not found...")
         create_text_slide(
             ["Backup & Restore Screen",
              "User selects backup file and confirms restore",
              "This triggers RestoreBackupService"],
-            'frames/slide_06_backup_screen.png'
+            f'frames/slide_06_backup_screen{ext}'
         )
-        image_files.append('frames/slide_06_backup_screen.png')
+        image_files.append(f'frames/slide_06_backup_screen{ext}')
     
     # Slide 7: Service starts explanation
     print("Creating slide 7: Service starts...")
@@ -280,9 +332,9 @@ def main():
          "4. Shows persistent notification to user",
          "5. Service continues running even if app is closed",
          "6. FOREGROUND_SERVICE_DATA_SYNC permission is required"],
-        'frames/slide_07_service_starts.png'
+        f'frames/slide_07_service_starts{ext}'
     )
-    image_files.append('frames/slide_07_service_starts.png')
+    image_files.append(f'frames/slide_07_service_starts{ext}')
     
     # Slide 8: Service running explanation
     print("Creating slide 8: Service running...")
@@ -293,9 +345,9 @@ def main():
          "Shows persistent notification with progress updates",
          "FOREGROUND_SERVICE_DATA_SYNC permission auto-granted",
          "Service continues even when user switches apps"],
-        'frames/slide_08_service_running.png'
+        f'frames/slide_08_service_running{ext}'
     )
-    image_files.append('frames/slide_08_service_running.png')
+    image_files.append(f'frames/slide_08_service_running{ext}')
     
     # Slide 9: Manifest declaration
     print("Creating slide 9: Manifest declaration...")
@@ -309,9 +361,9 @@ def main():
          "    android:foregroundServiceType=\"dataSync\" />",
          "",
          "Both are required for Android 14+ compatibility"],
-        'frames/slide_09_manifest.png'
+        f'frames/slide_09_manifest{ext}'
     )
-    image_files.append('frames/slide_09_manifest.png')
+    image_files.append(f'frames/slide_09_manifest{ext}')
     
     # Slide 10: What happens without permission
     print("Creating slide 10: Without permission...")
@@ -324,9 +376,9 @@ def main():
          "Users cannot restore their messages",
          "",
          "This permission ensures compatibility"],
-        'frames/slide_10_without_permission.png'
+        f'frames/slide_10_without_permission{ext}'
     )
-    image_files.append('frames/slide_10_without_permission.png')
+    image_files.append(f'frames/slide_10_without_permission{ext}')
     
     # Slide 11: What happens with permission
     print("Creating slide 11: With permission...")
@@ -340,9 +392,9 @@ def main():
          "Permission is auto-granted by system",
          "",
          "Seamless user experience"],
-        'frames/slide_11_with_permission.png'
+        f'frames/slide_11_with_permission{ext}'
     )
-    image_files.append('frames/slide_11_with_permission.png')
+    image_files.append(f'frames/slide_11_with_permission{ext}')
     
     # Slide 12: Summary
     print("Creating slide 12: Summary...")
@@ -356,19 +408,92 @@ def main():
          "",
          "Without it: Feature breaks on new Android versions",
          "With it: Feature works reliably across all versions"],
-        'frames/slide_12_summary.png'
+        f'frames/slide_12_summary{ext}'
     )
-    image_files.append('frames/slide_12_summary.png')
+    image_files.append(f'frames/slide_12_summary{ext}')
     
     # Create video
-    output_video = '../FOREGROUND_SERVICE_DATA_SYNC_DEMO.mp4'
+    if args.format == 'hls':
+        output_video = '../FOREGROUND_SERVICE_DATA_SYNC_DEMO_hls'
+    else:
+        output_video = '../FOREGROUND_SERVICE_DATA_SYNC_DEMO.mp4'
+    if not slide_renderer.flush():
+        print("\n[ERROR] Failed to render slides")
+        sys.exit(1)
     print(f"\nCreating video: {output_video}")
-    if create_video_from_images(image_files, output_video, fps=1, duration=8):
+    outputs = [output_video, video_previews.previews_dir_for(output_video), args.burned_copy]
+    # Outputs linked to stored blobs by an earlier run must not be rewritten in place
+    for path in filter(None, outputs):
+        artifact_store.release(path, args.artifact_store or artifact_store.DEFAULT_STORE_DIR)
+    crf = None
+    if args.target_size or args.target_bitrate:
+        target_bytes = video_budget.budget_bytes(len(image_files) * 8, args.target_size,
+                                                 args.target_bitrate)
+        # The narration track is added after the video encode, so the video gets what it leaves
+        audio_bytes = video_narration.audio_bytes(len(image_files) * 8) if args.narration else 0
+        if audio_bytes >= target_bytes:
+            print("\n[ERROR] The size budget does not cover the narration track")
+            sys.exit(1)
+        print("Searching CRF for size budget on sampled slides...")
+        crf, predicted_bytes = video_budget.choose_crf(image_files, target_bytes - audio_bytes, fps=1,
+                                                       duration=8)
+        if crf is None:
+            print("\n[ERROR] Failed to sample slides for size budget")
+            sys.exit(1)
+        predicted_bytes += audio_bytes
+        print(f"Using CRF {crf} (predicted {predicted_bytes / 1024 / 1024:.2f} MB)")
+    if create_video_from_images(image_files, output_video, fps=1, duration=8,
+                                output_format=args.format, captions=captions,
+                                transition=args.transition,
+                                transition_duration=args.transition_duration, crf=crf,
+                                store_path=args.frame_store):
+        if args.narration:
+            print(f"\nAdding narration (voice: {args.voice})...")
+            slide_texts = [video_narration.narration_text(slide_lines.get(img, []))
+                           for img in image_files if os.path.exists(img)]
+            extra_args = ['-movflags', video_segments.FRAGMENTED_MOVFLAGS] if args.format == 'fmp4' else []
+            if not video_narration.add_narration(output_video, slide_texts, duration=8,
+                                                 voice=args.voice, extra_args=extra_args):
+                print("\n[ERROR] Failed to add narration")
+                sys.exit(1)
         if os.path.exists(output_video):
-            file_size = os.path.getsize(output_video)
+            if os.path.isdir(output_video):
+                file_size = sum(e.stat().st_size for e in os.scandir(output_video))
+            else:
+                file_size = os.path.getsize(output_video)
             print(f"\n[SUCCESS] Video created successfully: {output_video}")
             print(f"Video size: {file_size / 1024 / 1024:.2f} MB")
             print(f"Duration: ~{len(image_files) * 8} seconds")
+            if args.deterministic:
+                digest, changed = video_determinism.record_content_hash(output_video)
+                status = "changed, publish" if changed else "unchanged since last build, skip publishing"
+                print(f"Content hash: {digest} ({status})")
+            if crf is not None:
+                video_budget.report(predicted_bytes, output_video, target_bytes)
+            if args.previews:
+                previews_dir = video_previews.previews_dir_for(output_video)
+                print(f"\nCreating previews: {previews_dir}")
+                if video_previews.create_previews(image_files, previews_dir, duration=8) is None:
+                    print("\n[ERROR] Failed to create previews")
+                    sys.exit(1)
+            if args.burned_copy:
+                print(f"\nCreating burned-in variant: {args.burned_copy}")
+                try:
+                    ok = video_subtitles.create_burned_video(image_files, args.burned_copy, burned_jobs(),
+                                                             fps=1, duration=8)
+                except ValueError as e:
+                    print(f"Error: {e}")
+                    ok = False
+                if not ok:
+                    print("\n[ERROR] Failed to create burned-in variant")
+                    sys.exit(1)
+            if args.artifact_store:
+                stored = {}
+                for path in filter(None, outputs):
+                    if os.path.exists(path):
+                        stored.update(artifact_store.store_output(path, args.artifact_store))
+                print(f"Stored {len(stored)} file(s) in {args.artifact_store} "
+                      f"({len(set(stored.values()))} unique)")
         else:
             print("\n[ERROR] Video file not created")
             sys.exit(1)
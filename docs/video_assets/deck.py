@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Deck definitions for demo videos
+A deck is a JSON-style dict of slides that can be rendered without writing a
+script for it:
+
+    {
+        "duration": 8,
+        "transition": "fade",
+        "narration": "en-us",
+        "slides": [
+            {"type": "text", "lines": ["Title", "Subtitle", ...]},
+            {"type": "screenshot", "image": "screenshot_main_menu.png",
+             "lines": ["Title", ...], "position": "bottom"},
+            {"type": "clip", "video": "restore_notification.mp4",
+             "start": 2.0, "end": 9.5, "lines": ["Narration", ...]}
+        ]
+    }
+
+"narration" is an optional espeak-ng voice that speaks each slide's lines on
+an audio track. Clip slides play a screen recording, trimmed to start/end
+seconds, for its own length; decks with clips cannot use transitions.
+Screenshot slides whose image is missing fall back to a text slide, as the
+scripts do. Image and video paths are relative to the deck's base directory.
+"""
+
+import hashlib
+import json
+import os
+
+import slide_images
+import slide_renderer
+import text_layout
+import video_clips
+import video_narration
+import video_segments
+import video_transitions
+
+DEFAULT_DURATION = 8
+SLIDE_CACHE_DIR = os.path.join('frames', 'slides')
+
+class DeckError(ValueError):
+    """Raised for deck definitions that cannot be rendered"""
+
+def image_path(slide, base_dir, key='image'):
+    """Resolve a slide's image (or clip video), refusing paths outside base_dir"""
+    image = slide.get(key)
+    if not image:
+        return None
+    path = os.path.realpath(os.path.join(base_dir, image))
+    if os.path.commonpath([path, os.path.realpath(base_dir)]) != os.path.realpath(base_dir):
+        raise DeckError(f"File outside of {base_dir}: {image}")
+    return path
+
+def _is_number(value):
+    # bool is an int subclass, but true is not a duration
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def validate(deck, base_dir='.'):
+    """Check a deck definition, raising DeckError for anything that cannot be rendered"""
+    if not isinstance(deck, dict) or not isinstance(deck.get('slides'), list) or not deck['slides']:
+        raise DeckError("A deck needs a non-empty 'slides' list")
+    duration = deck.get('duration', DEFAULT_DURATION)
+    if not _is_number(duration) or not 0 < duration <= 60:
+        raise DeckError("'duration' must be between 0 and 60 seconds")
+    transition = deck.get('transition')
+    if transition is not None and transition not in video_transitions.TRANSITIONS:
+        raise DeckError(f"Unknown transition: {transition}")
+    voice = deck.get('narration')
+    if voice is not None and not (isinstance(voice, str) and voice.replace('-', '').replace('+', '').isalnum()):
+        raise DeckError("'narration' must be an espeak-ng voice name")
+    for i, slide in enumerate(deck['slides'], 1):
+        if not isinstance(slide, dict):
+            raise DeckError(f"Slide {i}: must be an object")
+        if slide.get('type') not in ('text', 'screenshot', 'clip'):
+            raise DeckError(f"Slide {i}: 'type' must be 'text', 'screenshot' or 'clip'")
+        lines = slide.get('lines')
+        if not isinstance(lines, list) or not all(isinstance(line, str) for line in lines):
+            raise DeckError(f"Slide {i}: 'lines' must be a list of strings")
+        for key in ('image', 'video'):
+            if key in slide and not isinstance(slide[key], str):
+                raise DeckError(f"Slide {i}: '{key}' must be a path")
+        if slide.get('position', 'bottom') not in ('top', 'bottom'):
+            raise DeckError(f"Slide {i}: 'position' must be 'top' or 'bottom'")
+        if slide['type'] == 'screenshot':
+            image_path(slide, base_dir)
+        if slide['type'] == 'clip':
+            path = image_path(slide, base_dir, 'video')
+            if not path or not os.path.exists(path):
+                raise DeckError(f"Slide {i}: clip video not found: {slide.get('video')}")
+            for key in ('start', 'end'):
+                if not _is_number(slide.get(key, 0)) or slide.get(key, 0) < 0:
+                    raise DeckError(f"Slide {i}: '{key}' must be a number of seconds")
+            if slide.get('end') is not None and slide['end'] <= slide.get('start', 0):
+                raise DeckError(f"Slide {i}: 'end' must be after 'start'")
+            if transition is not None:
+                raise DeckError("Decks with clip slides cannot use transitions")
+
+def deck_hash(deck, base_dir='.'):
+    """Content hash of a deck: its definition plus the bytes of every screenshot it uses"""
+    digest = hashlib.sha256(json.dumps(deck, sort_keys=True, separators=(',', ':')).encode())
+    for slide in deck['slides']:
+        path = None
+        if slide.get('type') == 'screenshot':
+            path = image_path(slide, base_dir)
+        elif slide.get('type') == 'clip':
+            path = image_path(slide, base_dir, 'video')
+        if path and os.path.exists(path):
+            digest.update(video_segments.file_digest(path).encode())
+    return digest.hexdigest()
+
+def slide_key(slide, base_dir='.'):
+    """Cache key for a rendered slide: its definition, screenshot bytes and font"""
+    path = image_path(slide, base_dir) if slide.get('type') == 'screenshot' else None
+    image_digest = video_segments.file_digest(path) if path and os.path.exists(path) else ''
+    definition = json.dumps(slide, sort_keys=True, separators=(',', ':'))
+    return video_segments.cache_key(f"{definition}:{image_digest}:{text_layout.resolve_font()}")
+
+def render_slides(deck, frames_dir, base_dir='.', progress=None, cache_dir=SLIDE_CACHE_DIR):
+    """Render every slide of a deck, reusing slides rendered before from cache_dir
+
+    Returns one image file per slide, or a video_clips.Clip for clip slides.
+    """
+    os.makedirs(frames_dir, exist_ok=True)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Start clean if an earlier deck on this thread stopped before flushing
+    slide_renderer.discard()
+    image_files = []
+    rendered = {}
+    total = len(deck['slides'])
+    for i, slide in enumerate(deck['slides'], 1):
+        if slide['type'] == 'clip':
+            image_files.append(video_clips.Clip(image_path(slide, base_dir, 'video'),
+                                                slide.get('start', 0), slide.get('end')))
+            if progress:
+                progress(i, total)
+            continue
+        cached_file = os.path.join(cache_dir, f'{slide_key(slide, base_dir)}.png')
+        if os.path.exists(cached_file):
+            image_files.append(cached_file)
+            if progress:
+                progress(i, total)
+            continue
+        output_file = os.path.join(frames_dir, f'slide_{i:02d}.png')
+        path = image_path(slide, base_dir) if slide['type'] == 'screenshot' else None
+        if path and os.path.exists(path):
+            ok = slide_images.add_text_overlay_to_image(path, slide['lines'], output_file,
+                                                        position=slide.get('position', 'bottom'))
+        else:
+            if path:
+                print(f"Warning: {slide['image']} not found, creating text slide...")
+            ok = slide_images.create_text_slide(slide['lines'], output_file)
+        if ok is False:
+            return None
+        # Batched slides only exist after the flush below
+        rendered[output_file] = cached_file
+        image_files.append(cached_file)
+        if progress:
+            progress(i, total)
+    if not slide_renderer.flush():
+        return None
+    for output_file, cached_file in rendered.items():
+        os.replace(output_file, cached_file)
+    return image_files
+
+def render_deck(deck, output_video, frames_dir, base_dir='.', progress=None):
+    """Render a deck to an MP4 built from cached slide segments, narrated if it asks for it"""
+    validate(deck, base_dir)
+    image_files = render_slides(deck, frames_dir, base_dir, progress)
+    if image_files is None:
+        return False
+    duration = deck.get('duration', DEFAULT_DURATION)
+    transition = deck.get('transition')
+    if any(isinstance(item, video_clips.Clip) for item in image_files):
+        durations = video_clips.create_video_from_items(image_files, output_video, duration=duration)
+        ok = durations is not None
+        duration = durations
+    elif transition:
+        ok = video_transitions.create_video_with_transitions(
+            image_files, output_video, [transition] * len(image_files), duration=duration)
+    else:
+        ok = video_segments.create_video_from_segments(image_files, output_video, duration=duration)
+    if ok and deck.get('narration'):
+        slide_texts = [video_narration.narration_text(slide['lines']) for slide in deck['slides']]
+        ok = video_narration.add_narration(output_video, slide_texts, duration, voice=deck['narration'])
+    return ok
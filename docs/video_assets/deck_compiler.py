@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Compile markdown documents into deck definitions (see deck.py)
+Headings become title slides, their bullet points the subtitle lines and image
+links screenshot slides. Each section is cached by the hash of its text, so
+re-compiling only re-parses edited sections, and since rendered slides and
+segments are cached by content too, only their slides are rendered again.
+
+By default every release_notes/RELEASE_NOTES_*.md and the
+FOREGROUND_SERVICE_DATA_SYNC demonstration guide are compiled; --render also
+renders each deck whose definition changed since its last render.
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import unicodedata
+
+import deck as decks
+import resource_governor
+import video_segments
+
+# Bump when the parse rules change so cached sections are parsed again
+COMPILER_VERSION = 1
+SECTION_CACHE_FILE = os.path.join('frames', 'deck_sections.json')
+# Title plus subtitles; longer sections continue on further slides
+MAX_LINES = 6
+REPO_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+DEFAULT_SOURCES = [
+    os.path.join(REPO_ROOT, 'release_notes', 'RELEASE_NOTES_*.md'),
+    os.path.join(REPO_ROOT, 'docs', 'FOREGROUND_SERVICE_DATA_SYNC_DEMONSTRATION.md'),
+]
+
+HEADING = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+BULLET = re.compile(r'^\s*(?:[-*+]|\d+[.)])\s+(.*)$')
+IMAGE = re.compile(r'!\[([^\]]*)\]\(\s*([^)\s]+)[^)]*\)')
+
+def clean_inline(text):
+    """Strip markdown emphasis, code and links, and symbols the slide font cannot draw"""
+    text = IMAGE.sub('', text)
+    text = re.sub(r'\[([^\]]*)\]\([^)]*\)', r'\1', text)
+    text = re.sub(r'`([^`]*)`', r'\1', text)
+    # Only markers at word edges, so identifiers like FOREGROUND_SERVICE_DATA_SYNC survive
+    text = re.sub(r'(?<!\w)(\*\*|__|\*|_)(?=\S)(.+?)(?<=\S)\1(?!\w)', r'\2', text)
+    text = ''.join(c for c in text if unicodedata.category(c) not in ('So', 'Cs', 'Mn', 'Co'))
+    return ' '.join(text.split())
+
+def split_sections(markdown):
+    """Split a document into sections that each start at a heading, skipping code blocks"""
+    sections = []
+    current = []
+    fenced = False
+    for line in markdown.splitlines():
+        if line.lstrip().startswith('```'):
+            fenced = not fenced
+            continue
+        if fenced:
+            continue
+        if HEADING.match(line) and current:
+            sections.append('\n'.join(current))
+            current = []
+        current.append(line)
+    if current:
+        sections.append('\n'.join(current))
+    return sections
+
+def parse_section(text):
+    """Turn one section's markdown into slide definitions"""
+    title = None
+    bullets = []
+    paragraphs = []
+    images = []
+    for line in text.splitlines():
+        heading = HEADING.match(line)
+        if heading:
+            title = clean_inline(heading.group(2))
+            continue
+        for alt, target in IMAGE.findall(line):
+            if not re.match(r'[a-z]+://', target):
+                images.append((clean_inline(alt), target))
+        # Tables, quotes and rules do not fit on a slide
+        if not line.strip() or line.lstrip().startswith(('|', '>', '---', '***')):
+            continue
+        bullet = BULLET.match(line)
+        if bullet:
+            bullets.append(clean_inline(bullet.group(1)))
+        elif not IMAGE.fullmatch(line.strip()):
+            paragraphs.append(clean_inline(line))
+
+    bullets = [line for line in bullets if line]
+    title = title or (bullets[0] if bullets else None)
+    if not title:
+        return []
+    # Sections without bullets get their opening paragraph as the subtitle
+    lines = bullets or [line for line in paragraphs[:1] if line]
+    slides = []
+    per_slide = MAX_LINES - 1
+    for start in range(0, max(1, len(lines)), per_slide):
+        slide_title = title if start == 0 else f"{title} (continued)"
+        slides.append({'type': 'text', 'lines': [slide_title, *lines[start:start + per_slide]]})
+    for alt, target in images:
+        slides.append({'type': 'screenshot', 'image': target,
+                       'lines': [title, alt] if alt and alt != title else [title],
+                       'position': 'bottom'})
+    return slides
+
+def load_section_cache(cache_file=SECTION_CACHE_FILE):
+    try:
+        with open(cache_file, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_section_cache(cache, cache_file=SECTION_CACHE_FILE):
+    """Write the section cache atomically"""
+    os.makedirs(os.path.dirname(cache_file) or '.', exist_ok=True)
+    tmp_file = cache_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, sort_keys=True)
+    os.replace(tmp_file, cache_file)
+
+def compile_markdown(markdown_file, cache, duration=decks.DEFAULT_DURATION):
+    """Compile a markdown file into a deck, parsing only sections not in cache
+
+    Returns (deck, reparsed_section_count, section_keys); cache is updated in place.
+    """
+    with open(markdown_file, encoding='utf-8') as f:
+        sections = split_sections(f.read())
+    slides = []
+    reparsed = 0
+    keys = []
+    for section in sections:
+        key = video_segments.cache_key(f"{COMPILER_VERSION}:{section}")
+        if key not in cache:
+            cache[key] = parse_section(section)
+            reparsed += 1
+        slides.extend(cache[key])
+        keys.append(key)
+    return {'duration': duration, 'slides': slides}, reparsed, keys
+
+def deck_name(markdown_file):
+    """Output name for a markdown file's deck, e.g. RELEASE_NOTES_3.10.1"""
+    return os.path.splitext(os.path.basename(markdown_file))[0]
+
+def render_if_changed(deck, output_video, base_dir):
+    """Render a deck unless the video was last rendered from the same deck hash"""
+    digest = decks.deck_hash(deck, base_dir)
+    hash_file = output_video + '.deck'
+    if os.path.exists(output_video) and os.path.exists(hash_file):
+        with open(hash_file) as f:
+            if f.read().strip() == digest:
+                return None
+    frames_dir = os.path.join('frames', deck_name(output_video))
+    if not decks.render_deck(deck, output_video, frames_dir, base_dir):
+        return False
+    with open(hash_file, 'w') as f:
+        f.write(digest + '\n')
+    return True
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('markdown', nargs='*', help="markdown files (default: release notes and the demo guide)")
+    parser.add_argument('--output-dir', default='decks', help="where <name>.deck.json files are written")
+    parser.add_argument('--duration', type=float, default=decks.DEFAULT_DURATION, help="seconds per slide")
+    parser.add_argument('--render', action='store_true', help="also render each changed deck to <name>.mp4")
+    resource_governor.add_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    resource_governor.configure(args)
+    sources = args.markdown or sorted(f for pattern in DEFAULT_SOURCES for f in glob.glob(pattern))
+    if not sources:
+        print("Error: No markdown files found")
+        sys.exit(1)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    cache = load_section_cache()
+    used = set()
+    failed = []
+    for markdown_file in sources:
+        deck, reparsed, keys = compile_markdown(markdown_file, cache, args.duration)
+        used.update(keys)
+        name = deck_name(markdown_file)
+        deck_file = os.path.join(args.output_dir, f'{name}.deck.json')
+        with open(deck_file, 'w', encoding='utf-8') as f:
+            json.dump(deck, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f"{name}: {len(deck['slides'])} slide(s), {reparsed} section(s) parsed -> {deck_file}")
+
+        if args.render:
+            base_dir = os.path.dirname(os.path.abspath(markdown_file))
+            try:
+                result = render_if_changed(deck, os.path.join(args.output_dir, f'{name}.mp4'), base_dir)
+            except decks.DeckError as e:
+                print(f"  Error: {e}")
+                result = False
+            if result is None:
+                print("  Video unchanged, skipping render")
+            elif not result:
+                failed.append(name)
+
+    if not args.markdown:
+        # A full batch sees every document, so sections no document has any more can go
+        cache = {key: slides for key, slides in cache.items() if key in used}
+    save_section_cache(cache)
+    if failed:
+        print(f"\n[ERROR] Failed to render: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
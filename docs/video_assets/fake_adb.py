@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Fake adb for running screen_capture.py without an emulator
+Implements `devices`, `-s SERIAL shell ...`, `-s SERIAL exec-out screencap -p`
+and `-s SERIAL exec-out uiautomator dump /dev/tty`. A device's screen is a small
+PNG whose colour follows the shell commands sent since the last
+`am force-stop`, so the same steps always give the same capture and a screen
+whose steps change nothing repeats the previous capture.
+
+  FAKE_ADB_DEVICES  serials to report (default: emulator-5554 emulator-5556)
+  FAKE_ADB_TEXTS    '|'-separated view texts the UI dump contains
+                    (default: Backup and restore|Restore)
+  FAKE_ADB_STATE    directory for device state (default: <tmp>/fake_adb)
+
+Usage: ADB="python fake_adb.py" python screen_capture.py
+"""
+
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+import zlib
+
+WIDTH = 64
+HEIGHT = 36
+
+def state_file(serial):
+    state_dir = os.environ.get('FAKE_ADB_STATE', os.path.join(tempfile.gettempdir(), 'fake_adb'))
+    os.makedirs(state_dir, exist_ok=True)
+    return os.path.join(state_dir, serial)
+
+def screen_state(serial):
+    try:
+        with open(state_file(serial)) as f:
+            return f.read()
+    except FileNotFoundError:
+        return ''
+
+def png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+def screen_png(state):
+    """Solid-colour PNG derived from the device state"""
+    color = hashlib.sha256(state.encode()).digest()[:3]
+    rows = b''.join(b'\x00' + color * WIDTH for _ in range(HEIGHT))
+    return (b'\x89PNG\r\n\x1a\n'
+            + png_chunk(b'IHDR', struct.pack('>IIBBBBB', WIDTH, HEIGHT, 8, 2, 0, 0, 0))
+            + png_chunk(b'IDAT', zlib.compress(rows))
+            + png_chunk(b'IEND', b''))
+
+def ui_dump():
+    texts = os.environ.get('FAKE_ADB_TEXTS', 'Backup and restore|Restore').split('|')
+    nodes = ''.join(f'<node text="{text}" content-desc="" bounds="[0,{i * 100}][400,{i * 100 + 80}]" />'
+                    for i, text in enumerate(texts))
+    return f"<?xml version='1.0' encoding='UTF-8' ?><hierarchy>{nodes}</hierarchy>UI hierchary dumped to: /dev/tty\n"
+
+def main(argv):
+    devices = os.environ.get('FAKE_ADB_DEVICES', 'emulator-5554 emulator-5556').split()
+    if argv == ['devices']:
+        print('List of devices attached')
+        for serial in devices:
+            print(f'{serial}\tdevice')
+        return 0
+    if len(argv) < 3 or argv[0] != '-s':
+        print(f"fake_adb: unsupported command: {' '.join(argv)}", file=sys.stderr)
+        return 1
+    serial, command, args = argv[1], argv[2], argv[3:]
+    if serial not in devices:
+        print(f"adb: device '{serial}' not found", file=sys.stderr)
+        return 1
+
+    if command == 'shell':
+        line = ' '.join(args)
+        state = '' if line.startswith('am force-stop') else screen_state(serial)
+        with open(state_file(serial), 'w') as f:
+            f.write(f'{state}{line}\n')
+        return 0
+    if command == 'exec-out' and args == ['screencap', '-p']:
+        sys.stdout.buffer.write(screen_png(screen_state(serial)))
+        return 0
+    if command == 'exec-out' and args[:2] == ['uiautomator', 'dump']:
+        sys.stdout.write(ui_dump())
+        return 0
+    print(f"fake_adb: unsupported command: {' '.join(argv)}", file=sys.stderr)
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
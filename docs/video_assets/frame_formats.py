@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Intermediate frame formats for the frames/ cache
+Slides in frames/ are decoded again straight away by the encoder, so they can
+use a cheap format; exported or golden frames should stay zlib-compressed PNG
+"""
+
+# name -> (file extension, ffmpeg output arguments)
+FRAME_FORMATS = {
+    'png': ('.png', []),
+    'png0': ('.png', ['-compression_level', '0']),
+    'bmp': ('.bmp', []),
+    'qoi': ('.qoi', []),
+}
+DEFAULT_FRAME_FORMAT = 'png0'
+
+selected = DEFAULT_FRAME_FORMAT
+
+def select(name):
+    """Use a frame format for the rest of the run"""
+    global selected
+    if name not in FRAME_FORMATS:
+        raise ValueError(f"Unknown frame format: {name}")
+    selected = name
+
+def extension(name=None):
+    """File extension for a frame format (the selected one by default)"""
+    return FRAME_FORMATS[name or selected][0]
+
+def output_args(output_file, name=None):
+    """ffmpeg arguments for writing a frame in a format
+
+    Only frames whose extension matches the format get its arguments, so a
+    plain .png written elsewhere keeps ffmpeg's default compression.
+    """
+    ext, args = FRAME_FORMATS[name or selected]
+    return list(args) if output_file.lower().endswith(ext) else []
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped frame store for streaming slides to the encoder
+Normalized slide frames live in one memory-mapped file with a JSON index
+(slide id -> offset, dimensions, pixel format, source digest). Slides are
+decoded straight into the mapping once, and encodes pipe them to ffmpeg as
+rawvideo from memoryviews, so unchanged decks are re-encoded from the page
+cache without decoding anything. Slides are still rendered to image files
+first, since drawtext output is what the other encode paths use too; frames
+of slides a deck no longer has are compacted away before each encode
+"""
+
+import json
+import mmap
+import os
+import subprocess
+import threading
+
+import resource_governor
+import video_determinism
+import video_segments
+
+# Bytes per pixel for the pixel formats the store can hold
+PIXEL_BYTES = {'yuv420p': 1.5, 'rgb24': 3, 'gray': 1}
+
+class FrameStore:
+    """Slide frames of one size and pixel format in a single memory-mapped file"""
+
+    def __init__(self, path, width=1920, height=1080, pix_fmt='yuv420p'):
+        self.path = path
+        self.index_path = path + '.json'
+        self.width = width
+        self.height = height
+        self.pix_fmt = pix_fmt
+        self.frame_size = int(width * height * PIXEL_BYTES[pix_fmt])
+        self.index = {'end': 0, 'frames': {}}
+        if os.path.exists(self.index_path) and os.path.exists(path):
+            with open(self.index_path) as f:
+                index = json.load(f)
+            # Frames of another size or format would be misread, so start over
+            if all(frame['width'] == width and frame['height'] == height and frame['pix_fmt'] == pix_fmt
+                   for frame in index['frames'].values()):
+                self.index = index
+        self.file = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+        self.mm = None
+        self._resize(self.index['end'])
+
+    def _map(self):
+        """(Re)map the whole store file"""
+        if self.mm is not None:
+            self.mm.close()
+        size = os.fstat(self.file.fileno()).st_size
+        self.mm = mmap.mmap(self.file.fileno(), size) if size else None
+
+    def _resize(self, size):
+        """Set the file size and remap it; the old mapping is closed before the file changes"""
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        self.file.truncate(size)
+        self._map()
+
+    def _allocate(self, slide_id):
+        """Return the offset for a slide's frame, growing the file if it has none yet"""
+        entry = self.index['frames'].get(slide_id)
+        if entry is not None:
+            return entry['offset']
+        offset = self.index['end']
+        self._resize(offset + self.frame_size)
+        self.index['end'] = offset + self.frame_size
+        return offset
+
+    def compact(self, keep_ids):
+        """Drop frames of slides not in keep_ids and rewrite the file without the gaps
+
+        Returns the number of frames dropped.
+        """
+        keep = [slide_id for slide_id in dict.fromkeys(keep_ids) if slide_id in self.index['frames']]
+        dropped = len(self.index['frames']) - len(keep)
+        if not dropped:
+            return 0
+        frames = {}
+        tmp_file = video_segments.temp_path(self.path)
+        with open(tmp_file, 'wb') as f:
+            for i, slide_id in enumerate(keep):
+                view = self.frame(slide_id)
+                f.write(view)
+                view.release()
+                frames[slide_id] = dict(self.index['frames'][slide_id], offset=i * self.frame_size)
+        self.mm.close()
+        self.mm = None
+        self.file.close()
+        os.replace(tmp_file, self.path)
+        self.file = open(self.path, 'r+b')
+        self.index = {'end': len(keep) * self.frame_size, 'frames': frames}
+        self._map()
+        self.save_index()
+        return dropped
+
+    def save_index(self):
+        """Write the index atomically"""
+        tmp_file = self.index_path + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(self.index, f, indent=1, sort_keys=True)
+        os.replace(tmp_file, self.index_path)
+
+    def frame(self, slide_id):
+        """Zero-copy view of a stored frame"""
+        entry = self.index['frames'][slide_id]
+        return memoryview(self.mm)[entry['offset']:entry['offset'] + self.frame_size]
+
+    def put_image(self, slide_id, image_file):
+        """Decode and normalize a slide image into the store unless it is unchanged
+
+        Returns True if the frame was (re)decoded, False if the stored one was
+        reused, or None on error.
+        """
+        digest = video_segments.file_digest(image_file)
+        entry = self.index['frames'].get(slide_id)
+        if entry is not None and entry['digest'] == digest:
+            return False
+
+        offset = self._allocate(slide_id)
+        cmd = [
+            'ffmpeg',
+            '-v', 'error',
+            '-i', image_file,
+            '-vf', video_segments.SCALE_FILTER,
+            '-frames:v', '1',
+            '-pix_fmt', self.pix_fmt,
+            '-f', 'rawvideo',
+            'pipe:1'
+        ]
+        decoder = resource_governor.popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        # ffmpeg writes the pixels directly into the mapped region
+        view = memoryview(self.mm)[offset:offset + self.frame_size]
+        filled = 0
+        while filled < self.frame_size:
+            count = decoder.stdout.readinto(view[filled:])
+            if not count:
+                break
+            filled += count
+        view.release()
+        stderr = decoder.communicate()[1].decode(errors='replace')
+        if decoder.returncode != 0 or filled != self.frame_size:
+            print(f"Error decoding {image_file} into frame store: {stderr}")
+            self.index['frames'].pop(slide_id, None)
+            if entry is None:
+                # Give back the space allocated for the new frame
+                self.index['end'] = offset
+                self._resize(offset)
+            return None
+
+        self.index['frames'][slide_id] = {
+            'offset': offset,
+            'width': self.width,
+            'height': self.height,
+            'pix_fmt': self.pix_fmt,
+            'digest': digest,
+        }
+        self.save_index()
+        return True
+
+    def encode(self, slide_ids, output_video, fps=1, duration=8, extra_args=()):
+        """Encode stored frames, each shown for duration seconds, by piping rawvideo to ffmpeg"""
+        cmd = [
+            'ffmpeg',
+            '-y',
+            '-f', 'rawvideo',
+            '-pix_fmt', self.pix_fmt,
+            '-s', f'{self.width}x{self.height}',
+            '-framerate', str(fps),
+            '-i', 'pipe:0',
+            *video_segments.segment_encode_args(),
+            *extra_args,
+            *video_determinism.muxer_args(),
+            output_video
+        ]
+        resource_governor.acquire_slot()
+        try:
+            encoder = resource_governor.popen(cmd, stdin=subprocess.PIPE,
+                                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            # Drain stderr in the background so a chatty encoder cannot block the pipe
+            stderr_chunks = []
+            reader = _start_reader(encoder.stderr, stderr_chunks)
+            try:
+                for slide_id in slide_ids:
+                    view = self.frame(slide_id)
+                    for _ in range(max(1, int(fps * duration))):
+                        encoder.stdin.write(view)
+                    view.release()
+                encoder.stdin.close()
+            except BrokenPipeError:
+                pass
+            encoder.wait()
+            reader.join()
+        finally:
+            resource_governor.release_slot()
+        if encoder.returncode != 0:
+            print(f"FFmpeg error: {b''.join(stderr_chunks).decode(errors='replace')}")
+            return False
+        return True
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        self.file.close()
+
+def _start_reader(stream, chunks):
+    """Collect a stream's output on a background thread"""
+    reader = threading.Thread(target=lambda: chunks.append(stream.read()), daemon=True)
+    reader.start()
+    return reader
+
+def create_video_from_store(image_files, output_video, store_path, fps=1, duration=8, extra_args=()):
+    """Create a video through the frame store, decoding only slides that changed"""
+    existing_files = [f for f in image_files if os.path.exists(f)]
+
+    if not existing_files:
+        print("Error: No image files found")
+        return False
+
+    store = FrameStore(store_path)
+    try:
+        # Slides no longer in the deck (renamed, or another frame format) would grow the file forever
+        dropped = store.compact(existing_files)
+        decoded = 0
+        for img in existing_files:
+            result = store.put_image(img, img)
+            if result is None:
+                return False
+            decoded += result
+        print(f"  Frame store: {decoded} decoded, {len(existing_files) - decoded} reused, "
+              f"{dropped} dropped")
+        return store.encode(existing_files, output_video, fps, duration, extra_args)
+    finally:
+        store.close()
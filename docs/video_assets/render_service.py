@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Local HTTP render service for demo videos
+Accepts deck definitions (see deck.py), renders them on a worker pool and
+serves the finished videos from a content-addressed cache, so a deck that was
+rendered before is returned immediately. Uses only the standard library and ffmpeg.
+
+  POST /jobs            deck JSON -> {"id", "status", "progress", "video"}
+  GET  /jobs/<id>       job status and progress
+  GET  /videos/<id>.mp4 finished video (supports Range requests)
+  GET  /health
+
+"video" is a URL relative to the request, so it also works behind a proxy
+prefix. When --max-queued decks are waiting, new ones get 503. Once the cache
+holds more than --max-cache-mb, the least recently requested videos are evicted.
+"""
+
+import argparse
+import json
+import os
+import posixpath
+import queue
+import re
+import shutil
+import sys
+import tempfile
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import deck as decks
+import resource_governor
+import slide_images
+
+MAX_DECK_BYTES = 1024 * 1024
+# Finished jobs beyond this are forgotten; their videos stay in the cache
+MAX_TRACKED_JOBS = 1000
+
+class ServiceBusy(Exception):
+    """Raised when the render queue is full"""
+
+def video_url(job_id):
+    """Path of a finished video, relative to the service root"""
+    return f'videos/{job_id}.mp4'
+
+def parse_range(header, size):
+    """Resolve a single-range Range header against a file size
+
+    Returns (start, end, partial) with end inclusive, or None if the range
+    cannot be satisfied. Headers that are missing or not a single byte range
+    select the whole file.
+    """
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', header or '')
+    if not match or not (match.group(1) or match.group(2)):
+        return 0, size - 1, False
+    if match.group(1):
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+    else:
+        start, end = max(0, size - int(match.group(2))), size - 1
+    if start > end:
+        return None
+    return start, end, True
+
+class RenderService:
+    """Job queue, worker pool and video cache behind the HTTP handler"""
+
+    def __init__(self, cache_dir, base_dir, workers=1, max_queued=16, max_cache_bytes=None):
+        self.cache_dir = cache_dir
+        self.base_dir = base_dir
+        self.max_cache_bytes = max_cache_bytes
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=max_queued)
+        os.makedirs(cache_dir, exist_ok=True)
+        for _ in range(workers):
+            threading.Thread(target=self.worker, daemon=True).start()
+
+    def video_path(self, job_id):
+        return os.path.join(self.cache_dir, f'{job_id}.mp4')
+
+    def submit(self, deck):
+        """Queue a deck unless it is cached or already queued; returns its job
+
+        Raises DeckError for an invalid deck and ServiceBusy when the queue is full.
+        """
+        try:
+            decks.validate(deck, self.base_dir)
+            job_id = decks.deck_hash(deck, self.base_dir)
+        except decks.DeckError:
+            raise
+        except Exception as e:
+            # Anything validate() did not anticipate is still the client's deck
+            raise decks.DeckError(f"Invalid deck: {e}") from e
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None and job['status'] != 'failed':
+                return dict(job)
+            job = {'id': job_id, 'status': 'queued', 'progress': 0.0, 'video': None, 'error': None}
+            if os.path.exists(self.video_path(job_id)):
+                # Marks the video as recently used for eviction
+                os.utime(self.video_path(job_id))
+                job.update(status='done', progress=1.0, video=video_url(job_id))
+            else:
+                try:
+                    self.queue.put_nowait((job_id, deck))
+                except queue.Full:
+                    raise ServiceBusy("Render queue is full, try again later") from None
+            self.jobs.pop(job_id, None)
+            self.jobs[job_id] = job
+            self.forget_finished()
+            return dict(job)
+
+    def forget_finished(self):
+        """Drop the oldest finished jobs beyond MAX_TRACKED_JOBS (call with the lock held)"""
+        finished = [job_id for job_id, job in self.jobs.items() if job['status'] in ('done', 'failed')]
+        for job_id in finished[:max(0, len(self.jobs) - MAX_TRACKED_JOBS)]:
+            del self.jobs[job_id]
+
+    def evict(self, keep_id):
+        """Delete the least recently used videos until the cache fits max_cache_bytes
+
+        keep_id is the video just rendered, which is never evicted. Jobs of
+        evicted videos are forgotten, so the deck renders again when resubmitted.
+        """
+        if self.max_cache_bytes is None:
+            return
+        with self.lock:
+            videos = []
+            for name in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, name)
+                if name.endswith('.mp4') and os.path.isfile(path):
+                    st = os.stat(path)
+                    videos.append((st.st_mtime, st.st_size, name[:-len('.mp4')]))
+            total = sum(size for _, size, _ in videos)
+            for _, size, job_id in sorted(videos):
+                if total <= self.max_cache_bytes:
+                    break
+                if job_id == keep_id:
+                    continue
+                os.remove(self.video_path(job_id))
+                self.jobs.pop(job_id, None)
+                total -= size
+
+    def status(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None and os.path.exists(self.video_path(job_id)):
+                job = {'id': job_id, 'status': 'done', 'progress': 1.0,
+                       'video': video_url(job_id), 'error': None}
+            return dict(job) if job else None
+
+    def update(self, job_id, **fields):
+        with self.lock:
+            self.jobs[job_id].update(fields)
+
+    def worker(self):
+        while True:
+            job_id, deck = self.queue.get()
+            work_dir = tempfile.mkdtemp(prefix=f'render_{job_id[:12]}_')
+            try:
+                self.update(job_id, status='running')
+                # Slides are the first 90%; encoding the video is the rest
+                def progress(done, total):
+                    self.update(job_id, progress=round(0.9 * done / total, 3))
+
+                output_video = os.path.join(work_dir, 'video.mp4')
+                if decks.render_deck(deck, output_video, os.path.join(work_dir, 'frames'),
+                                     self.base_dir, progress):
+                    os.replace(output_video, self.video_path(job_id))
+                    self.update(job_id, status='done', progress=1.0, video=video_url(job_id))
+                    self.evict(job_id)
+                else:
+                    self.update(job_id, status='failed', error='Rendering failed, see service log')
+            except Exception as e:
+                self.update(job_id, status='failed', error=str(e))
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+                self.queue.task_done()
+
+class RenderHandler(BaseHTTPRequestHandler):
+    """HTTP front end for a RenderService"""
+
+    service = None
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_job(self, status, job):
+        """Send a job with its video URL made relative to the request path"""
+        if job['video']:
+            job = dict(job, video=posixpath.relpath('/' + job['video'], posixpath.dirname(self.path)))
+        self.send_json(status, job)
+
+    def do_GET(self):
+        if self.path == '/health':
+            return self.send_json(HTTPStatus.OK, {'status': 'ok'})
+        match = re.fullmatch(r'/jobs/([0-9a-f]{64})', self.path)
+        if match:
+            job = self.service.status(match.group(1))
+            if job is None:
+                return self.send_json(HTTPStatus.NOT_FOUND, {'error': 'Unknown job'})
+            return self.send_job(HTTPStatus.OK, job)
+        match = re.fullmatch(r'/videos/([0-9a-f]{64})\.mp4', self.path)
+        if match:
+            return self.send_video(self.service.video_path(match.group(1)))
+        self.send_json(HTTPStatus.NOT_FOUND, {'error': 'Not found'})
+
+    def do_POST(self):
+        if self.path != '/jobs':
+            return self.send_json(HTTPStatus.NOT_FOUND, {'error': 'Not found'})
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = 0
+        if not 0 < length <= MAX_DECK_BYTES:
+            return self.send_json(HTTPStatus.BAD_REQUEST, {'error': 'Missing or oversized deck'})
+        try:
+            job = self.service.submit(json.loads(self.rfile.read(length)))
+        except (ValueError, decks.DeckError) as e:
+            return self.send_json(HTTPStatus.BAD_REQUEST, {'error': str(e)})
+        except ServiceBusy as e:
+            return self.send_json(HTTPStatus.SERVICE_UNAVAILABLE, {'error': str(e)})
+        status = HTTPStatus.OK if job['status'] == 'done' else HTTPStatus.ACCEPTED
+        self.send_job(status, job)
+
+    def send_video(self, path):
+        """Serve a cached video, honouring a single byte range"""
+        if not os.path.exists(path):
+            return self.send_json(HTTPStatus.NOT_FOUND, {'error': 'Video not rendered'})
+        size = os.path.getsize(path)
+        byte_range = parse_range(self.headers.get('Range', ''), size)
+        if byte_range is None:
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.end_headers()
+            return
+        start, end, partial = byte_range
+        if partial:
+            self.send_response(HTTPStatus.PARTIAL_CONTENT)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        # Content-addressed, so a URL never changes what it serves
+        self.send_header('Cache-Control', 'public, max-age=31536000, immutable')
+        self.end_headers()
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=os.environ.get('RENDER_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('RENDER_PORT', 8090)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('RENDER_WORKERS', 1)),
+                        help="decks rendered at the same time")
+    parser.add_argument('--max-queued', type=int, default=int(os.environ.get('RENDER_MAX_QUEUED', 16)),
+                        help="decks waiting to render before new ones are refused")
+    parser.add_argument('--cache-dir', default=os.environ.get('RENDER_CACHE_DIR', 'render_cache'),
+                        help="where finished videos are kept, named by deck hash")
+    parser.add_argument('--max-cache-mb', type=float, default=float(os.environ.get('RENDER_MAX_CACHE_MB', 2048)),
+                        help="cache size above which the least recently used videos are evicted")
+    parser.add_argument('--base-dir', default='.',
+                        help="directory that screenshot paths in decks are relative to")
+    resource_governor.add_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    resource_governor.configure(args)
+
+    if not slide_images.check_ffmpeg():
+        print("Error: ffmpeg not found. Please install ffmpeg first.")
+        sys.exit(1)
+
+    RenderHandler.service = RenderService(args.cache_dir, args.base_dir, max(1, args.workers),
+                                          max(1, args.max_queued), int(args.max_cache_mb * 1024 * 1024))
+    server = ThreadingHTTPServer((args.host, args.port), RenderHandler)
+    print(f"Render service listening on http://{args.host}:{args.port} (cache: {args.cache_dir})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Resource governor for video builds on shared hosts
+Caps ffmpeg threads, concurrent jobs and memory, applies nice/ionice to child
+processes and backs off concurrency when the host's load average is high
+
+Settings come from the command line or from the environment:
+  VIDEO_MAX_THREADS   total encoder threads across all jobs (default: all cores)
+  VIDEO_MAX_JOBS      concurrent ffmpeg processes (default: 1)
+  VIDEO_MAX_MEMORY_MB address space shared by concurrent jobs (default: unlimited)
+  VIDEO_NICE          niceness added to child processes (default: 0)
+  VIDEO_IONICE        I/O class for child processes: idle or best-effort
+  VIDEO_ADAPTIVE      1 to lower concurrency while the load average is high
+"""
+
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+IONICE_CLASSES = {'best-effort': '2', 'idle': '3'}
+
+settings = {
+    'max_threads': os.cpu_count() or 1,
+    'max_jobs': 1,
+    'max_memory_mb': 0,
+    'nice': 0,
+    'ionice': None,
+    'adaptive': False,
+}
+
+_slots = threading.Condition()
+_running = 0
+
+def _env_settings():
+    """Read settings from VIDEO_* environment variables"""
+    env = {}
+    for key, name, convert in [('max_threads', 'VIDEO_MAX_THREADS', int),
+                               ('max_jobs', 'VIDEO_MAX_JOBS', int),
+                               ('max_memory_mb', 'VIDEO_MAX_MEMORY_MB', int),
+                               ('nice', 'VIDEO_NICE', int),
+                               ('ionice', 'VIDEO_IONICE', str),
+                               ('adaptive', 'VIDEO_ADAPTIVE', lambda v: v.lower() in ('1', 'true', 'yes'))]:
+        if os.environ.get(name):
+            try:
+                env[key] = convert(os.environ[name])
+            except ValueError:
+                print(f"Warning: ignoring {name}={os.environ[name]!r}, expected a number")
+    return env
+
+def add_arguments(parser):
+    """Add the governor's command line options to an argparse parser"""
+    group = parser.add_argument_group('resource limits (default to VIDEO_* environment variables)')
+    group.add_argument('--max-threads', type=int, help="total ffmpeg threads across all jobs")
+    group.add_argument('--max-jobs', type=int, help="concurrent ffmpeg processes")
+    group.add_argument('--max-memory-mb', type=int, help="memory shared by concurrent ffmpeg processes")
+    group.add_argument('--nice', type=int, help="niceness added to ffmpeg processes")
+    group.add_argument('--ionice', choices=sorted(IONICE_CLASSES), help="I/O scheduling class for ffmpeg")
+    group.add_argument('--adaptive', action='store_true', default=None,
+                       help="lower concurrency while the system load average is high")
+
+def configure(args=None):
+    """Apply settings from the environment, then from parsed command line options"""
+    settings.update(_env_settings())
+    if args is not None:
+        for key in settings:
+            if getattr(args, key, None) is not None:
+                settings[key] = getattr(args, key)
+    if settings['ionice'] and settings['ionice'] not in IONICE_CLASSES:
+        raise ValueError(f"Unknown ionice class: {settings['ionice']}")
+    settings['max_jobs'] = max(1, settings['max_jobs'])
+    settings['max_threads'] = max(1, settings['max_threads'])
+    if settings['max_memory_mb'] and not shutil.which('prlimit'):
+        print("Warning: prlimit not found, memory limit not applied")
+
+def job_limit():
+    """Number of jobs allowed to run right now"""
+    limit = settings['max_jobs']
+    if settings['adaptive'] and hasattr(os, 'getloadavg'):
+        # Leave the cores other builds are already using alone
+        idle_cores = (os.cpu_count() or 1) - os.getloadavg()[0]
+        limit = min(limit, max(1, int(idle_cores)))
+    return limit
+
+def threads_per_job():
+    """Encoder threads each ffmpeg process may use"""
+    return max(1, settings['max_threads'] // settings['max_jobs'])
+
+# ffmpeg options that take no value; every other option consumes the next argument
+FLAG_OPTIONS = {'-y', '-n', '-an', '-vn', '-sn', '-dn', '-copyts', '-shortest', '-nostdin',
+                '-hide_banner', '-nostats', '-stats', '-re', '-xerror', '-version'}
+
+def output_positions(cmd):
+    """Indexes of the output files in an ffmpeg command line"""
+    positions = []
+    i = 1
+    while i < len(cmd):
+        arg = cmd[i]
+        if arg in FLAG_OPTIONS:
+            i += 1
+        elif arg.startswith('-') and arg != '-':
+            i += 2
+        else:
+            positions.append(i)
+            i += 1
+    return positions
+
+def governed_command(cmd):
+    """Apply the thread cap, memory limit, niceness and I/O class to a command line
+
+    Limits are applied by wrapper commands rather than a preexec_fn, which is
+    not safe while other threads are starting processes.
+    """
+    cmd = list(cmd)
+    if os.path.basename(cmd[0]).startswith('ffmpeg') and '-threads' not in cmd:
+        threads = str(threads_per_job())
+        # -threads is an output option, so it goes right before every output file
+        for position in reversed(output_positions(cmd)):
+            cmd[position:position] = ['-threads', threads]
+        cmd[1:1] = ['-filter_threads', threads]
+    if settings['max_memory_mb'] and shutil.which('prlimit'):
+        limit = settings['max_memory_mb'] * 1024 * 1024 // settings['max_jobs']
+        cmd = ['prlimit', f'--as={limit}', *cmd]
+    if settings['nice'] and shutil.which('nice'):
+        cmd = ['nice', '-n', str(settings['nice']), *cmd]
+    if settings['ionice'] and shutil.which('ionice'):
+        cmd = ['ionice', '-c', IONICE_CLASSES[settings['ionice']], *cmd]
+    return cmd
+
+def acquire_slot():
+    """Block until a job slot is free"""
+    global _running
+    with _slots:
+        # Re-check periodically, since the adaptive limit follows the load average
+        while _running >= job_limit():
+            _slots.wait(timeout=1.0)
+        _running += 1
+
+def release_slot():
+    """Give a job slot back"""
+    global _running
+    with _slots:
+        _running -= 1
+        _slots.notify_all()
+
+def run(cmd, **kwargs):
+    """subprocess.run for ffmpeg within the governor's limits"""
+    acquire_slot()
+    try:
+        return subprocess.run(governed_command(cmd), **kwargs)
+    finally:
+        release_slot()
+
+def popen(cmd, **kwargs):
+    """subprocess.Popen for copy-only ffmpeg remuxers
+
+    These take no job slot: they are cheap, and they stay open while the
+    encodes feeding them need the slots.
+    """
+    return subprocess.Popen(governed_command(cmd), **kwargs)
+
+def map_jobs(func, items):
+    """Run func over items on up to max_jobs threads, returning results in order"""
+    items = list(items)
+    if settings['max_jobs'] == 1 or len(items) < 2:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=settings['max_jobs']) as pool:
+        return list(pool.map(func, items))
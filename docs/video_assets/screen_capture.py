@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Screenshot capture from Android emulators
+Runs a scripted list of screens (see capture_screens.json) and captures each
+one with `adb exec-out screencap -p`, streaming the PNG straight into a
+content-addressed screenshot cache without a round trip through /sdcard.
+Screens are spread over all connected emulators in parallel, and a capture
+identical to the device's previous one (the screen had not changed yet) is
+retried rather than kept, so stale pulls never reach a video.
+
+Each screen's steps must start from a known state (e.g. force-stop and launch
+the app). A step is either an `adb shell` command line or {"tap_text": "..."},
+which taps the centre of the first view whose text or content description
+matches.
+
+Set ADB (or --adb) to another adb command line, such as "python fake_adb.py",
+to run the pipeline without an emulator.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import queue
+import re
+import shlex
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import video_segments
+
+SCREENSHOT_CACHE_DIR = 'screenshots'
+DEFAULT_SCRIPT = 'capture_screens.json'
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+DEFAULT_SETTLE = 1.0
+RETRIES = 3
+
+class CaptureError(Exception):
+    """Raised when a device cannot be driven or captured"""
+
+def adb_command(adb, serial, *args):
+    """Build an adb command line for one device"""
+    return [*shlex.split(adb), '-s', serial, *args]
+
+def list_devices(adb):
+    """Serials of the devices adb reports as ready"""
+    result = subprocess.run([*shlex.split(adb), 'devices'], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise CaptureError(f"adb devices failed: {result.stderr.strip()}")
+    devices = []
+    for line in result.stdout.splitlines()[1:]:
+        fields = line.split()
+        if len(fields) == 2 and fields[1] == 'device':
+            devices.append(fields[0])
+    return devices
+
+def load_script(path):
+    """Load and check a capture script"""
+    with open(path, encoding='utf-8') as f:
+        script = json.load(f)
+    screens = script.get('screens')
+    if not isinstance(screens, list) or not screens:
+        raise CaptureError(f"{path}: needs a non-empty 'screens' list")
+    for screen in screens:
+        if not re.fullmatch(r'[a-z0-9_]+', screen.get('name', '')):
+            raise CaptureError(f"{path}: screen names must be lowercase words, got {screen.get('name')!r}")
+        for step in screen.get('steps', []):
+            if not isinstance(step, str) and not (isinstance(step, dict) and 'tap_text' in step):
+                raise CaptureError(f"{path}: {screen['name']}: unknown step {step!r}")
+    return script
+
+def find_text_bounds(hierarchy, text):
+    """Centre of the first view in a uiautomator dump whose text or description is text"""
+    for node in re.finditer(r'<node\b[^>]*>', hierarchy):
+        attrs = dict(re.findall(r'([\w-]+)="([^"]*)"', node.group(0)))
+        if text in (attrs.get('text'), attrs.get('content-desc')):
+            left, top, right, bottom = map(int, re.findall(r'\d+', attrs.get('bounds', '')))
+            return (left + right) // 2, (top + bottom) // 2
+    return None
+
+def run_step(adb, serial, step):
+    """Run one script step on a device"""
+    if isinstance(step, dict):
+        # The view may still be animating in, so look for it a few times
+        for _ in range(RETRIES):
+            result = subprocess.run(adb_command(adb, serial, 'exec-out', 'uiautomator', 'dump', '/dev/tty'),
+                                    capture_output=True, text=True)
+            point = find_text_bounds(result.stdout, step['tap_text']) if result.returncode == 0 else None
+            if point is not None:
+                break
+            time.sleep(0.5)
+        else:
+            raise CaptureError(f"{serial}: no view with text {step['tap_text']!r}")
+        step = f'input tap {point[0]} {point[1]}'
+    result = subprocess.run(adb_command(adb, serial, 'shell', step), capture_output=True, text=True)
+    if result.returncode != 0:
+        raise CaptureError(f"{serial}: '{step}' failed: {result.stderr.strip()}")
+
+def capture_png(adb, serial, cache_dir=SCREENSHOT_CACHE_DIR):
+    """Stream a screencap into the cache and return its path and digest"""
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_file = video_segments.temp_path(os.path.join(cache_dir, serial))
+    digest = hashlib.sha256()
+    proc = subprocess.Popen(adb_command(adb, serial, 'exec-out', 'screencap', '-p'),
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        with open(tmp_file, 'wb') as f:
+            for chunk in iter(lambda: proc.stdout.read(256 * 1024), b''):
+                digest.update(chunk)
+                f.write(chunk)
+        stderr = proc.communicate()[1].decode(errors='replace')
+        with open(tmp_file, 'rb') as f:
+            signature = f.read(len(PNG_SIGNATURE))
+        if proc.returncode != 0 or signature != PNG_SIGNATURE:
+            raise CaptureError(f"{serial}: screencap did not return a PNG: {stderr.strip()}")
+        cached_file = os.path.join(cache_dir, f'{digest.hexdigest()}.png')
+        os.replace(tmp_file, cached_file)
+        return cached_file, digest.hexdigest()
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+def capture_screen(adb, serial, screen, previous_digest, cache_dir=SCREENSHOT_CACHE_DIR):
+    """Drive a device to a screen and capture it once it differs from the previous capture"""
+    for step in screen.get('steps', []):
+        run_step(adb, serial, step)
+    settle = screen.get('settle', DEFAULT_SETTLE)
+    for _ in range(RETRIES):
+        time.sleep(settle)
+        cached_file, digest = capture_png(adb, serial, cache_dir)
+        if digest != previous_digest:
+            return cached_file, digest
+    raise CaptureError(f"{serial}: {screen['name']} is identical to the previous capture "
+                       f"after {RETRIES} tries")
+
+def capture_all(adb, serials, screens, cache_dir=SCREENSHOT_CACHE_DIR):
+    """Capture screens across devices in parallel
+
+    Returns ({name: (cached_file, digest)}, [names of failed screens]).
+    """
+    pending = queue.Queue()
+    for screen in screens:
+        pending.put(screen)
+    captures = {}
+    failures = []
+    lock = threading.Lock()
+
+    def device_worker(serial):
+        previous_digest = None
+        while True:
+            try:
+                screen = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                cached_file, previous_digest = capture_screen(adb, serial, screen, previous_digest, cache_dir)
+                print(f"  {serial}: {screen['name']} ({previous_digest[:12]})")
+                with lock:
+                    captures[screen['name']] = (cached_file, previous_digest)
+            except CaptureError as e:
+                print(f"Error: {e}")
+                with lock:
+                    failures.append(screen['name'])
+
+    with ThreadPoolExecutor(max_workers=len(serials)) as pool:
+        list(pool.map(device_worker, serials))
+    return captures, failures
+
+def publish(screens, captures, output_dir='.'):
+    """Copy captures to the screenshot_<name>.png files the scripts read"""
+    for screen in screens:
+        if screen['name'] not in captures:
+            continue
+        cached_file = captures[screen['name']][0]
+        for name in [screen['name'], *screen.get('aliases', [])]:
+            shutil.copyfile(cached_file, os.path.join(output_dir, f'screenshot_{name}.png'))
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--script', default=DEFAULT_SCRIPT, help=f"capture script (default: {DEFAULT_SCRIPT})")
+    parser.add_argument('--serial', action='append',
+                        help="device to capture from; repeat for several (default: every connected device)")
+    parser.add_argument('--only', action='append', metavar='NAME', help="capture only these screens")
+    parser.add_argument('--adb', default=os.environ.get('ADB', 'adb'), help="adb command line (default: $ADB or adb)")
+    parser.add_argument('--output-dir', default='.', help="where screenshot_<name>.png files are written")
+    parser.add_argument('--cache-dir', default=SCREENSHOT_CACHE_DIR)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    try:
+        script = load_script(args.script)
+        serials = args.serial or list_devices(args.adb)
+    except (OSError, ValueError, CaptureError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if not serials:
+        print("Error: no devices connected. Start an emulator or pass --serial.")
+        sys.exit(1)
+    screens = [s for s in script['screens'] if not args.only or s['name'] in args.only]
+
+    print(f"Capturing {len(screens)} screen(s) on {len(serials)} device(s): {', '.join(serials)}")
+    captures, failures = capture_all(args.adb, serials, screens, args.cache_dir)
+
+    # Different screens that came out identical usually mean a step did nothing
+    by_digest = {}
+    for name, (_, digest) in captures.items():
+        by_digest.setdefault(digest, []).append(name)
+    for names in by_digest.values():
+        if len(names) > 1:
+            print(f"Warning: identical captures for {', '.join(sorted(names))}")
+
+    publish(screens, captures, args.output_dir)
+    print(f"\nCaptured {len(captures)} of {len(screens)} screen(s)")
+    if failures:
+        print(f"[ERROR] Failed: {', '.join(failures)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
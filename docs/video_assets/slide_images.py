@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Slide images for demo videos
+Builds the ffmpeg render jobs for text slides and screenshot overlays, so the
+demo scripts, decks, the render service and the benchmarks all draw slides
+the same way. Each script keeps its own look through a SlideStyle.
+"""
+
+import os
+import shutil
+import subprocess
+from collections import namedtuple
+
+import frame_formats
+import slide_renderer
+import text_layout
+
+# Font sizes and line gaps as (title, subtitle); boxes are drawtext box options
+SlideStyle = namedtuple('SlideStyle', ['overlay_sizes', 'overlay_gaps', 'title_box', 'subtitle_box',
+                                       'text_sizes', 'text_gaps', 'escape_equals'])
+
+COMPREHENSIVE_STYLE = SlideStyle(
+    overlay_sizes=(60, 35), overlay_gaps=(25, 18),
+    title_box='boxcolor=0x000000@0.85:boxborderw=15', subtitle_box='boxcolor=0x000000@0.75:boxborderw=8',
+    text_sizes=(70, 45), text_gaps=(30, 20), escape_equals=True)
+BACKUP_STYLE = SlideStyle(
+    overlay_sizes=(50, 30), overlay_gaps=(20, 15),
+    title_box='boxcolor=0x000000@0.8:boxborderw=10', subtitle_box='boxcolor=0x000000@0.7:boxborderw=5',
+    text_sizes=(60, 40), text_gaps=(20, 15), escape_equals=False)
+SUBTITLE_COLOR = '#4CAF50'
+
+def check_ffmpeg():
+    """Check if ffmpeg is available"""
+    try:
+        result = subprocess.run(['ffmpeg', '-version'],
+                              capture_output=True, text=True)
+        return result.returncode == 0
+    except FileNotFoundError:
+        return False
+
+def escape_text(line, style=COMPREHENSIVE_STYLE):
+    """Escape single quotes and special characters for drawtext"""
+    escaped_text = line.replace("'", "\\'").replace(":", "\\:")
+    return escaped_text.replace("=", "\\=") if style.escape_equals else escaped_text
+
+def overlay_filter(text_lines, text_color='white', title_size=None, subtitle_size=None,
+                   position='bottom', width=1920, height=1080, style=COMPREHENSIVE_STYLE):
+    """Build the drawtext filter that overlays text lines on a screenshot"""
+    drawtext_filters = []
+    font_option = text_layout.drawtext_font_option()
+    placements = text_layout.layout_lines(text_lines, width, height, title_size or style.overlay_sizes[0],
+                                          subtitle_size or style.overlay_sizes[1],
+                                          title_gap=style.overlay_gaps[0], subtitle_gap=style.overlay_gaps[1],
+                                          region='bottom' if position == 'bottom' else 'top')
+
+    for placement in placements:
+        if not placement.text:
+            continue
+        escaped_text = escape_text(placement.text, style)
+        if placement.role == 'title':
+            # Title - larger, bold
+            drawtext_filters.append(
+                f"drawtext={font_option}text='{escaped_text}':fontsize={placement.size}:fontcolor={text_color}:"
+                f"x={placement.x}:y={placement.y}:"
+                f"box=1:{style.title_box}"
+            )
+        else:
+            # Subtitle - smaller
+            drawtext_filters.append(
+                f"drawtext={font_option}text='{escaped_text}':fontsize={placement.size}:"
+                f"fontcolor={SUBTITLE_COLOR}:x={placement.x}:y={placement.y}:"
+                f"box=1:{style.subtitle_box}"
+            )
+
+    return ','.join(drawtext_filters)
+
+def overlay_job(input_image, text_lines, output_file, text_color='white', title_size=None,
+                subtitle_size=None, position='bottom', style=COMPREHENSIVE_STYLE):
+    """Render job that draws text lines over a screenshot at its own size
+
+    Raises ValueError if the screenshot's size cannot be determined.
+    """
+    width, height = text_layout.image_size(input_image)
+    return slide_renderer.SlideJob(
+        'overlay', ['-i', input_image],
+        overlay_filter(text_lines, text_color, title_size, subtitle_size, position, width, height, style),
+        output_file, frame_formats.output_args(output_file))
+
+def add_text_overlay_to_image(input_image, text_lines, output_file,
+                              text_color='white', title_size=None, subtitle_size=None,
+                              position='bottom', captions=None, style=COMPREHENSIVE_STYLE):
+    """Add text overlay to an existing screenshot
+
+    If a captions dict is given, the lines are recorded there as soft subtitles
+    for output_file and the screenshot is stored without drawing any text.
+    The frame may be queued until slide_renderer.flush().
+    """
+    if not os.path.exists(input_image):
+        print(f"Warning: Input image not found: {input_image}")
+        return False
+
+    if captions is not None:
+        captions[output_file] = text_lines
+        if os.path.splitext(input_image)[1] == os.path.splitext(output_file)[1]:
+            shutil.copyfile(input_image, output_file)
+            return True
+        # Only a conversion to the intermediate frame format is needed
+        job = slide_renderer.SlideJob('convert', ['-i', input_image], None, output_file,
+                                      frame_formats.output_args(output_file))
+    else:
+        try:
+            job = overlay_job(input_image, text_lines, output_file, text_color, title_size, subtitle_size,
+                              position, style)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return False
+    return slide_renderer.submit(job)
+
+def text_slide_job(text_lines, output_file, width=1920, height=1080, bg_color='0x1a1a1a',
+                   text_color='white', title_size=None, subtitle_size=None, style=COMPREHENSIVE_STYLE):
+    """Render job that draws text lines on a plain background"""
+    drawtext_filters = []
+    font_option = text_layout.drawtext_font_option()
+    placements = text_layout.layout_lines(text_lines, width, height, title_size or style.text_sizes[0],
+                                          subtitle_size or style.text_sizes[1],
+                                          title_gap=style.text_gaps[0], subtitle_gap=style.text_gaps[1])
+
+    for placement in placements:
+        if not placement.text:
+            continue
+        escaped_text = escape_text(placement.text, style)
+        color = text_color if placement.role == 'title' else SUBTITLE_COLOR
+        drawtext_filters.append(
+            f"drawtext={font_option}text='{escaped_text}':fontsize={placement.size}:fontcolor={color}:"
+            f"x={placement.x}:y={placement.y}"
+        )
+
+    return slide_renderer.SlideJob(
+        'text', ['-f', 'lavfi', '-i', f'color=c={bg_color}:s={width}x{height}:d=1'],
+        ','.join(drawtext_filters), output_file, frame_formats.output_args(output_file))
+
+def create_text_slide(text_lines, output_file, width=1920, height=1080, bg_color='0x1a1a1a',
+                      text_color='white', title_size=None, subtitle_size=None, style=COMPREHENSIVE_STYLE):
+    """Create an image with multiple lines of text using ffmpeg
+
+    The frame may be queued until slide_renderer.flush().
+    """
+    return slide_renderer.submit(text_slide_job(text_lines, output_file, width, height, bg_color,
+                                                text_color, title_size, subtitle_size, style))
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Adaptive slide rendering backends
+A slide render is an ffmpeg input plus a filter chain and an output frame. It
+can run as its own ffmpeg process ("process"), or be queued and run together
+with the other slides of its type in a single filtergraph with one output per
+slide ("batch"), which saves a process start and font load per slide.
+
+Timings per slide type and backend are kept in a local stats file, and each
+slide goes to the fastest backend that calibration has shown to produce
+byte-identical frames on this host; until then everything uses "process".
+Timings are collected per thread and merged into the file once per flush().
+
+Usage: python slide_renderer.py calibrate [--slides N]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+import resource_governor
+import video_segments
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+BACKENDS = ['process', 'batch']
+REFERENCE_BACKEND = 'process'
+STATS_FILE = os.environ.get('VIDEO_RENDER_STATS', os.path.join('frames', 'render_stats.json'))
+# Outputs per batched ffmpeg run, which bounds its memory and command line
+MAX_BATCH = 16
+# Later timings move the average by at most 1/STATS_WINDOW
+STATS_WINDOW = 20
+
+# kind: slide type ('text', 'overlay', or 'convert' for a plain format conversion); input_args: ffmpeg input options ending
+# in '-i ...'; vf_filter: filter chain or None; output_args: options for the frame
+SlideJob = namedtuple('SlideJob', ['kind', 'input_args', 'vf_filter', 'output_file', 'output_args'])
+
+_lock = threading.Lock()
+# Queued jobs, failures and timings are per thread, so concurrent callers
+# (render service workers) each flush and report only their own slides
+_local = threading.local()
+
+def _state():
+    """This thread's queued jobs, failed outputs and unsaved (kind, backend, seconds) timings"""
+    if not hasattr(_local, 'pending'):
+        _local.pending = []
+        _local.failed = []
+        _local.timings = []
+    return _local
+
+def host_key():
+    """Stats are per machine, since the fastest backend depends on it"""
+    return f"{platform.node()}/{os.cpu_count()}"
+
+def load_stats(stats_file=STATS_FILE):
+    """Recorded timings as {host: {kind: {backend: entry}}}, or {} if there are none"""
+    try:
+        with open(stats_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_stats(stats, stats_file=STATS_FILE):
+    """Write the stats file atomically"""
+    os.makedirs(os.path.dirname(stats_file) or '.', exist_ok=True)
+    tmp_file = video_segments.temp_path(stats_file)
+    with open(tmp_file, 'w') as f:
+        json.dump(stats, f, indent=1, sort_keys=True)
+    os.replace(tmp_file, stats_file)
+
+@contextlib.contextmanager
+def _stats_lock(stats_file):
+    """Serialize stats updates between threads and, where flock exists, processes"""
+    with _lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(stats_file) or '.', exist_ok=True)
+        with open(stats_file + '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+def save_timings(timings, stats_file=STATS_FILE):
+    """Fold measured (kind, backend, seconds_per_slide) timings into the running averages"""
+    if not timings:
+        return
+    with _stats_lock(stats_file):
+        stats = load_stats(stats_file)
+        host = stats.setdefault(host_key(), {})
+        for kind, backend, seconds_per_slide in timings:
+            entry = host.setdefault(kind, {}).setdefault(
+                backend, {'mean': seconds_per_slide, 'count': 0, 'identical': backend == REFERENCE_BACKEND})
+            entry['count'] += 1
+            entry['mean'] += (seconds_per_slide - entry['mean']) / min(entry['count'], STATS_WINDOW)
+        save_stats(stats, stats_file)
+
+def choose_backend(kind, stats_file=STATS_FILE):
+    """Fastest backend with identical output for a slide type on this host"""
+    timings = load_stats(stats_file).get(host_key(), {}).get(kind, {})
+    candidates = [(entry['mean'], backend) for backend, entry in timings.items()
+                  if entry.get('identical') and backend in BACKENDS]
+    return min(candidates)[1] if candidates else REFERENCE_BACKEND
+
+def job_command(job):
+    """ffmpeg command rendering one slide in its own process"""
+    vf_args = ['-vf', job.vf_filter] if job.vf_filter else []
+    return ['ffmpeg', '-y', *job.input_args, *vf_args, '-frames:v', '1', *job.output_args, job.output_file]
+
+def batch_command(jobs):
+    """ffmpeg command rendering several slides through one filtergraph"""
+    cmd = ['ffmpeg', '-y']
+    for job in jobs:
+        cmd += job.input_args
+    graph = [f"[{i}:v]{job.vf_filter or 'null'}[out{i}]" for i, job in enumerate(jobs)]
+    cmd += ['-filter_complex', ';'.join(graph)]
+    for i, job in enumerate(jobs):
+        cmd += ['-map', f'[out{i}]', '-frames:v', '1', *job.output_args, job.output_file]
+    return cmd
+
+def run_process(job):
+    """Render one slide with its own ffmpeg process; returns True on success"""
+    result = resource_governor.run(job_command(job), capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"Error rendering {job.output_file}: {result.stderr}")
+        return False
+    return True
+
+def run_batch(jobs):
+    """Render slides in a single ffmpeg run; returns True only if all of them succeeded"""
+    result = resource_governor.run(batch_command(jobs), capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"Error rendering batch of {len(jobs)} slide(s): {result.stderr}")
+        return False
+    return True
+
+def submit(job, backend=None):
+    """Render a slide now, or queue it for flush() if its type renders faster batched
+
+    Failures are also remembered, so flush() reports every slide this thread
+    submitted since the last flush() or discard().
+    """
+    backend = backend or choose_backend(job.kind)
+    state = _state()
+    if backend == 'batch':
+        state.pending.append(job)
+        return True
+    start = time.perf_counter()
+    ok = run_process(job)
+    if ok:
+        state.timings.append((job.kind, 'process', time.perf_counter() - start))
+    else:
+        state.failed.append(job.output_file)
+    return ok
+
+def discard():
+    """Forget this thread's queued jobs and failures (timings are kept for the next flush)"""
+    state = _state()
+    state.pending, state.failed = [], []
+
+def flush():
+    """Render this thread's queued slides, one batched ffmpeg run per slide type and chunk
+
+    Returns False if any slide submitted since the last flush() failed. The
+    timings measured since the last flush() are saved in one update.
+    """
+    state = _state()
+    jobs, failed = state.pending, state.failed
+    discard()
+    timings, state.timings = state.timings, []
+    ok = not failed
+    for kind in sorted({job.kind for job in jobs}):
+        same_kind = [job for job in jobs if job.kind == kind]
+        for i in range(0, len(same_kind), MAX_BATCH):
+            chunk = same_kind[i:i + MAX_BATCH]
+            start = time.perf_counter()
+            if run_batch(chunk):
+                timings.append((kind, 'batch', (time.perf_counter() - start) / len(chunk)))
+            else:
+                # Fall back to the reference backend rather than lose the slides
+                ok = all([run_process(job) for job in chunk]) and ok
+    save_timings(timings)
+    return ok
+
+def calibrate(jobs_by_kind, stats_file=STATS_FILE):
+    """Time every backend on sample jobs and record which ones match the reference output
+
+    jobs_by_kind maps a slide type to a function that builds its sample jobs
+    for a given output directory.
+    """
+    results = {}
+    for kind, build_jobs in jobs_by_kind.items():
+        reference = None
+        for backend in BACKENDS:
+            work_dir = tempfile.mkdtemp(prefix=f'calibrate_{kind}_{backend}_')
+            try:
+                jobs = build_jobs(work_dir)
+                start = time.perf_counter()
+                if backend == 'batch':
+                    ok = all(run_batch(jobs[i:i + MAX_BATCH]) for i in range(0, len(jobs), MAX_BATCH))
+                else:
+                    ok = all([run_process(job) for job in jobs])
+                per_slide = (time.perf_counter() - start) / len(jobs)
+                if not ok:
+                    print(f"  {kind:8} {backend:8} failed")
+                    continue
+                digests = [video_segments.file_digest(job.output_file) for job in jobs]
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            if backend == REFERENCE_BACKEND:
+                reference = digests
+            identical = digests == reference
+            results.setdefault(kind, {})[backend] = {'mean': per_slide, 'count': 1, 'identical': identical}
+            print(f"  {kind:8} {backend:8} {per_slide * 1000:8.1f} ms/slide"
+                  f"{'' if identical else '  (output differs, not used)'}")
+    with _stats_lock(stats_file):
+        stats = load_stats(stats_file)
+        host = stats.setdefault(host_key(), {})
+        for kind, backends in results.items():
+            host.setdefault(kind, {}).update(backends)
+        save_stats(stats, stats_file)
+    for kind in jobs_by_kind:
+        print(f"{kind} slides will use: {choose_backend(kind, stats_file)}")
+
+def sample_jobs(slides):
+    """Calibration job builders for each slide type, in the default slide style"""
+    # slide_images builds on this module, so it is only imported when calibrating
+    from slide_images import overlay_job, text_slide_job
+
+    screenshot = next((f for f in sorted(os.listdir('.')) if f.startswith('screenshot_') and f.endswith('.png')),
+                      None)
+
+    def text_jobs(work_dir):
+        return [text_slide_job([f"Calibration slide {i}", "Subtitle line one", "Subtitle line two"],
+                               os.path.join(work_dir, f'text_{i:02d}.png')) for i in range(slides)]
+
+    def overlay_jobs(work_dir):
+        return [overlay_job(screenshot, [f"Calibration slide {i}", "Overlay subtitle"],
+                            os.path.join(work_dir, f'overlay_{i:02d}.png')) for i in range(slides)]
+
+    def convert_jobs(work_dir):
+        return [SlideJob('convert', ['-i', screenshot], None, os.path.join(work_dir, f'convert_{i:02d}.bmp'), [])
+                for i in range(slides)]
+
+    builders = {'text': text_jobs}
+    if screenshot:
+        builders['overlay'] = overlay_jobs
+        builders['convert'] = convert_jobs
+    else:
+        print("Warning: no screenshot_*.png here, skipping overlay and convert slides")
+    return builders
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    calibrate_parser = commands.add_parser('calibrate', help="benchmark every backend on this host")
+    calibrate_parser.add_argument('--slides', type=int, default=8, help="sample slides per type")
+    commands.add_parser('show', help="print the recorded timings")
+    resource_governor.add_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    resource_governor.configure(args)
+    if args.command == 'calibrate':
+        if not shutil.which('ffmpeg'):
+            print("Error: ffmpeg not found. Please install ffmpeg first.")
+            sys.exit(1)
+        print(f"Calibrating slide backends on {host_key()}...")
+        calibrate(sample_jobs(max(1, args.slides)))
+    else:
+        timings = load_stats().get(host_key(), {})
+        for kind, backends in sorted(timings.items()):
+            for backend, entry in sorted(backends.items()):
+                print(f"{kind:8} {backend:8} {entry['mean'] * 1000:8.1f} ms/slide  n={entry['count']}"
+                      f"{'' if entry.get('identical') else '  (not verified identical)'}")
+
+if __name__ == '__main__':
+    main()
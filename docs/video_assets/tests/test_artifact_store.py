@@ -0,0 +1,43 @@
+import os
+import stat
+
+import pytest
+
+import artifact_store
+
+@pytest.fixture
+def store(tmp_path):
+    return str(tmp_path / 'store')
+
+@pytest.fixture
+def output_dir(tmp_path):
+    path = tmp_path / 'hls'
+    path.mkdir()
+    (path / 'segment_000.ts').write_bytes(b'segment')
+    (path / 'playlist.m3u8').write_bytes(b'playlist')
+    (path / 'content.sha256').write_text('abc  hls\n')
+    return str(path)
+
+def test_add_blob_leaves_the_source_writable(tmp_path, store):
+    video = tmp_path / 'demo.mp4'
+    video.write_bytes(b'video')
+    digest = artifact_store.add_blob(str(video), store)
+    assert not os.path.samefile(video, artifact_store.blob_path(digest, store))
+    assert os.stat(video).st_mode & stat.S_IWUSR
+
+def test_store_output_skips_hash_sidecars(output_dir, store):
+    stored = artifact_store.store_output(output_dir, store, 'hardlink')
+    assert sorted(os.path.basename(path) for path in stored) == ['playlist.m3u8', 'segment_000.ts']
+
+def test_release_only_unlinks_stored_blobs(tmp_path, output_dir, store):
+    artifact_store.store_output(output_dir, store, 'hardlink')
+    user_copy = tmp_path / 'backup.m3u8'
+    os.link(os.path.join(output_dir, 'playlist.m3u8'), user_copy)
+    own_link = tmp_path / 'mine.txt'
+    own_link.write_bytes(b'mine')
+    os.link(own_link, tmp_path / 'mine_too.txt')
+
+    artifact_store.release(output_dir, store)
+    artifact_store.release(str(own_link), store)
+    assert sorted(os.listdir(output_dir)) == ['content.sha256']
+    assert user_copy.exists() and own_link.exists()
@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+import deck as decks
+from render_service import RenderService, parse_range
+
+SIZE = 1000
+
+@pytest.mark.parametrize('header', ['', None, 'bytes=-', 'items=0-10', 'bytes=0-10,20-30'])
+def test_no_single_range_serves_whole_file(header):
+    assert parse_range(header, SIZE) == (0, SIZE - 1, False)
+
+@pytest.mark.parametrize('header,expected', [
+    ('bytes=0-99', (0, 99, True)),
+    ('bytes=500-', (500, SIZE - 1, True)),
+    ('bytes=900-5000', (900, SIZE - 1, True)),
+    ('bytes=-100', (900, SIZE - 1, True)),
+    ('bytes=-5000', (0, SIZE - 1, True)),
+    ('bytes=999-999', (999, 999, True)),
+])
+def test_satisfiable_ranges(header, expected):
+    assert parse_range(header, SIZE) == expected
+
+@pytest.mark.parametrize('header', ['bytes=1000-', 'bytes=50-10', 'bytes=-0'])
+def test_unsatisfiable_ranges(header):
+    assert parse_range(header, SIZE) is None
+
+def test_eviction_drops_least_recently_used_videos(tmp_path):
+    service = RenderService(str(tmp_path), str(tmp_path), workers=0, max_cache_bytes=250)
+    for age, job_id in enumerate(['c' * 64, 'b' * 64, 'a' * 64]):
+        path = service.video_path(job_id)
+        with open(path, 'wb') as f:
+            f.write(bytes(100))
+        os.utime(path, (1000 + age, 1000 + age))
+        service.jobs[job_id] = {'id': job_id, 'status': 'done'}
+    service.evict('a' * 64)
+    assert sorted(os.listdir(tmp_path)) == ['a' * 64 + '.mp4', 'b' * 64 + '.mp4']
+    assert 'c' * 64 not in service.jobs
+
+@pytest.mark.parametrize('start,end', [(5, 5), (5, 2)])
+def test_clip_must_end_after_it_starts(tmp_path, start, end):
+    (tmp_path / 'clip.mp4').write_bytes(b'mp4')
+    deck = {'slides': [{'type': 'clip', 'video': 'clip.mp4', 'start': start, 'end': end, 'lines': []}]}
+    with pytest.raises(decks.DeckError, match="'end' must be after 'start'"):
+        decks.validate(deck, str(tmp_path))
@@ -0,0 +1,72 @@
+import struct
+
+import pytest
+
+import text_layout
+
+WIDTH, HEIGHT, MARGIN = 1920, 1080, 60
+
+def right_edge(placement):
+    return placement.x + text_layout.text_width(placement.text, placement.size, text_layout.font_metrics())
+
+def test_title_comes_first_and_lines_go_down():
+    placements = text_layout.layout_lines(["Title", "First subtitle", "Second subtitle"])
+    assert [p.role for p in placements] == ['title', 'subtitle', 'subtitle']
+    assert [p.text for p in placements] == ["Title", "First subtitle", "Second subtitle"]
+    assert placements[0].size > placements[1].size
+    assert all(a.y < b.y for a, b in zip(placements, placements[1:]))
+
+def test_long_line_wraps_within_margins():
+    long_line = ' '.join(['FOREGROUND_SERVICE_DATA_SYNC permission'] * 8)
+    placements = text_layout.layout_lines(["Title", long_line])
+    subtitles = [p for p in placements if p.role == 'subtitle']
+    assert len(subtitles) > 1
+    assert ' '.join(p.text for p in subtitles) == long_line
+    for placement in placements:
+        assert placement.x >= MARGIN - 1
+        assert right_edge(placement) <= WIDTH - MARGIN + 1
+
+def test_unbreakable_word_is_split_or_shrunk_to_fit():
+    word = 'com.moez.QKSMS.feature.backup.RestoreBackupService' * 3
+    for placement in text_layout.layout_lines([word], title_size=80):
+        assert right_edge(placement) <= WIDTH - MARGIN + 1
+
+@pytest.mark.parametrize('region', ['top', 'bottom', 'center'])
+def test_block_is_anchored_to_region(region):
+    placements = text_layout.layout_lines(["Title", "Subtitle"], region=region)
+    top = placements[0].y
+    bottom = placements[-1].y + placements[-1].size
+    if region == 'top':
+        assert top == MARGIN
+    elif region == 'bottom':
+        assert bottom == pytest.approx(HEIGHT - MARGIN, abs=2)
+    else:
+        assert top - MARGIN == pytest.approx(HEIGHT - bottom - MARGIN, abs=2)
+
+def test_tall_block_is_scaled_down_but_not_below_min_scale():
+    lines = ["Title"] + [f"Subtitle line {i}" for i in range(30)]
+    placements = text_layout.layout_lines(lines, title_size=60, subtitle_size=40, min_scale=0.5)
+    assert placements[0].size < 60
+    assert all(p.size >= int(40 * 0.5) for p in placements if p.role == 'subtitle')
+
+def test_block_that_fits_keeps_its_sizes():
+    placements = text_layout.layout_lines(["Title", "Subtitle"], title_size=60, subtitle_size=40)
+    assert [p.size for p in placements] == [60, 40]
+
+def test_image_size_reads_png_header(tmp_path):
+    image = tmp_path / 'slide.png'
+    image.write_bytes(b'\x89PNG\r\n\x1a\n' + b'\0\0\0\rIHDR' + struct.pack('>II', 1280, 720))
+    assert text_layout.image_size(str(image)) == (1280, 720)
+
+def test_image_size_reads_jpeg_start_of_frame(tmp_path):
+    image = tmp_path / 'screenshot.jpg'
+    app0 = b'\xff\xe0' + struct.pack('>H', 16) + b'JFIF\0' + bytes(9)
+    sof0 = b'\xff\xc0' + struct.pack('>HBHHB', 11, 8, 1440, 2560, 3) + bytes(3)
+    image.write_bytes(b'\xff\xd8' + app0 + sof0 + b'\xff\xd9')
+    assert text_layout.image_size(str(image)) == (2560, 1440)
+
+def test_image_size_fails_loudly_for_unreadable_images(tmp_path):
+    image = tmp_path / 'broken.webp'
+    image.write_bytes(b'not an image')
+    with pytest.raises(ValueError):
+        text_layout.image_size(str(image))
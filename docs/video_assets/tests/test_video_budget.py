@@ -0,0 +1,58 @@
+import pytest
+
+import video_budget
+
+def fake_size(image_file, crf, fps, duration):
+    """Sample size that falls steadily as CRF rises"""
+    return 1000 * (video_budget.MAX_CRF + 1 - crf)
+
+@pytest.fixture
+def slides(tmp_path):
+    files = []
+    for i in range(5):
+        path = tmp_path / f'slide_{i}.png'
+        path.write_bytes(b'png')
+        files.append(str(path))
+    return files
+
+@pytest.fixture
+def encodes(monkeypatch):
+    calls = []
+
+    def encode_sample(image_file, crf, fps, duration):
+        calls.append((image_file, crf))
+        return fake_size(image_file, crf, fps, duration)
+
+    monkeypatch.setattr(video_budget, 'encode_sample', encode_sample)
+    return calls
+
+def predicted(slides, crf):
+    return fake_size(None, crf, 1, 8) * len(slides) * video_budget.CONTAINER_OVERHEAD
+
+def test_generous_budget_uses_min_crf(slides, encodes):
+    crf, size = video_budget.choose_crf(slides, 10 ** 9)
+    assert crf == video_budget.MIN_CRF
+    assert size == pytest.approx(predicted(slides, crf))
+
+def test_budget_below_smallest_size_uses_max_crf(slides, encodes):
+    crf, _ = video_budget.choose_crf(slides, 1)
+    assert crf == video_budget.MAX_CRF
+
+def test_picks_lowest_crf_that_fits(slides, encodes):
+    target = predicted(slides, 30) + 1
+    crf, size = video_budget.choose_crf(slides, target)
+    assert crf == 30
+    assert size <= target
+    assert predicted(slides, crf - 1) > target
+
+def test_each_sample_is_encoded_once_per_crf(slides, encodes):
+    video_budget.choose_crf(slides, predicted(slides, 25))
+    assert len(encodes) == len(set(encodes))
+    assert {img for img, _ in encodes} <= set(video_budget.sample_slides(slides))
+
+def test_failed_sample_returns_none(slides, monkeypatch):
+    monkeypatch.setattr(video_budget, 'encode_sample', lambda *args: None)
+    assert video_budget.choose_crf(slides, 10 ** 6) == (None, None)
+
+def test_missing_slides_return_none(tmp_path):
+    assert video_budget.choose_crf([str(tmp_path / 'missing.png')], 10 ** 6) == (None, None)
@@ -0,0 +1,42 @@
+import pytest
+
+from video_clips import plan_cuts
+
+FPS = 25
+KEYFRAMES = [0.0, 1.0, 2.0, 3.0, 4.0, 5.0]
+
+def assert_contiguous(pieces, start, end):
+    assert pieces[0][0] == pytest.approx(start, abs=0.5 / FPS)
+    assert pieces[-1][1] == end
+    for (_, a_end, _), (b_start, _, _) in zip(pieces, pieces[1:]):
+        assert a_end == b_start
+
+def test_start_on_keyframe_needs_no_leading_reencode():
+    assert plan_cuts(KEYFRAMES, 1.0, 3.5, FPS) == [(1.0, 3.0, True), (3.0, 3.5, False)]
+
+def test_start_within_half_a_frame_of_keyframe_snaps_to_it():
+    assert plan_cuts(KEYFRAMES, 0.99, 3.0, FPS) == [(1.0, 3.0, True)]
+
+def test_start_before_keyframe_reencodes_up_to_it():
+    assert plan_cuts(KEYFRAMES, 0.5, 3.0, FPS) == [(0.5, 1.0, False), (1.0, 3.0, True)]
+
+def test_end_on_keyframe_needs_no_trailing_reencode():
+    pieces = plan_cuts(KEYFRAMES, 1.0, 4.0, FPS)
+    assert pieces == [(1.0, 4.0, True)]
+
+def test_partial_gops_at_both_ends():
+    assert plan_cuts(KEYFRAMES, 0.3, 4.6, FPS) == [(0.3, 1.0, False), (1.0, 4.0, True), (4.0, 4.6, False)]
+
+@pytest.mark.parametrize('keyframes', [[0.0, 5.0], [0.0, 2.0, 5.0]])
+def test_fewer_than_two_keyframes_inside_reencodes_everything(keyframes):
+    assert plan_cuts(keyframes, 1.0, 4.0, FPS) == [(1.0, 4.0, False)]
+
+@pytest.mark.parametrize('start,end', [(0.0, 5.0), (0.2, 2.7), (1.98, 5.0), (2.5, 2.9), (0.0, 0.5)])
+def test_pieces_cover_the_range(start, end):
+    pieces = plan_cuts(KEYFRAMES, start, end, FPS)
+    assert_contiguous(pieces, start, end)
+    for piece_start, piece_end, copy in pieces:
+        assert piece_end > piece_start
+        if copy:
+            # Stream-copied pieces must start and end on keyframes
+            assert piece_start in KEYFRAMES and piece_end in KEYFRAMES
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Text layout for slides and overlays
+Measures text with per-font glyph metrics read once from the TrueType file,
+wraps and shrinks lines to fit the canvas, balances the block vertically and
+returns absolute positions, so renderers never have to measure text themselves
+"""
+
+import functools
+import os
+import re
+import struct
+import subprocess
+from collections import namedtuple
+
+# Checked in order when VIDEO_FONT_FILE is not set
+FONT_CANDIDATES = [
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/TTF/DejaVuSans.ttf',
+    '/Library/Fonts/Arial.ttf',
+    '/System/Library/Fonts/Supplemental/Arial.ttf',
+    'C:/Windows/Fonts/arial.ttf',
+]
+# Used without a readable font file: rough advance widths in em for a sans-serif face
+FALLBACK_ADVANCE = 0.56
+FALLBACK_ADVANCES = {
+    **dict.fromkeys(" !'(),./:;I[]`fijlrt|", 0.32),
+    **dict.fromkeys('"-_{}', 0.42),
+    **dict.fromkeys('ABCDEGHKNOQRSUVXYmw', 0.70),
+    **dict.fromkeys('MW@', 0.90),
+}
+# Lines may be broken after these characters when a single word does not fit
+BREAK_AFTER = '/.="-_:,'
+
+FontMetrics = namedtuple('FontMetrics', 'font_file advances default_advance')
+Placement = namedtuple('Placement', 'text x y size role')
+
+@functools.lru_cache(maxsize=None)
+def resolve_font(font_file=None):
+    """Return the font file to use, resolved once per run (None if none is found)"""
+    for candidate in [font_file, os.environ.get('VIDEO_FONT_FILE'), *FONT_CANDIDATES]:
+        if candidate and os.path.exists(candidate):
+            return candidate
+    return None
+
+def _read_tables(data):
+    """Return the table directory of a TrueType/OpenType font"""
+    num_tables = struct.unpack_from('>H', data, 4)[0]
+    tables = {}
+    for i in range(num_tables):
+        tag, _, offset, length = struct.unpack_from('>4sIII', data, 12 + 16 * i)
+        tables[tag.decode('latin-1')] = (offset, length)
+    return tables
+
+def _read_cmap(data, offset):
+    """Map code points to glyph ids from a format 4 (BMP) cmap subtable"""
+    num_subtables = struct.unpack_from('>H', data, offset + 2)[0]
+    for i in range(num_subtables):
+        platform, encoding, sub_offset = struct.unpack_from('>HHI', data, offset + 4 + 8 * i)
+        start = offset + sub_offset
+        if (platform, encoding) in ((3, 1), (0, 3), (0, 4)) and struct.unpack_from('>H', data, start)[0] == 4:
+            break
+    else:
+        return {}
+
+    seg_count = struct.unpack_from('>H', data, start + 6)[0] // 2
+    ends = struct.unpack_from(f'>{seg_count}H', data, start + 14)
+    starts = struct.unpack_from(f'>{seg_count}H', data, start + 16 + 2 * seg_count)
+    deltas = struct.unpack_from(f'>{seg_count}h', data, start + 16 + 4 * seg_count)
+    range_offsets_at = start + 16 + 6 * seg_count
+    range_offsets = struct.unpack_from(f'>{seg_count}H', data, range_offsets_at)
+
+    cmap = {}
+    for seg, (first, last, delta, range_offset) in enumerate(zip(starts, ends, deltas, range_offsets)):
+        # Only the printable Latin range matters for slide text
+        for code in range(max(first, 0x20), min(last, 0x24ff) + 1):
+            if range_offset == 0:
+                glyph = (code + delta) & 0xFFFF
+            else:
+                glyph_at = range_offsets_at + 2 * seg + range_offset + 2 * (code - first)
+                glyph = struct.unpack_from('>H', data, glyph_at)[0]
+                if glyph:
+                    glyph = (glyph + delta) & 0xFFFF
+            if glyph:
+                cmap[chr(code)] = glyph
+    return cmap
+
+@functools.lru_cache(maxsize=None)
+def font_metrics(font_file=None):
+    """Load per-glyph advance widths for a font, cached for the rest of the run"""
+    font_file = resolve_font(font_file)
+    if font_file is None:
+        return FontMetrics(None, FALLBACK_ADVANCES, FALLBACK_ADVANCE)
+
+    with open(font_file, 'rb') as f:
+        data = f.read()
+    tables = _read_tables(data)
+    units_per_em = struct.unpack_from('>H', data, tables['head'][0] + 18)[0]
+    num_metrics = struct.unpack_from('>H', data, tables['hhea'][0] + 34)[0]
+    widths = struct.unpack_from(f'>{num_metrics * 2}H', data, tables['hmtx'][0])[::2]
+
+    advances = {}
+    for char, glyph in _read_cmap(data, tables['cmap'][0]).items():
+        # Glyphs past the last long metric share its advance width
+        advances[char] = widths[min(glyph, num_metrics - 1)] / units_per_em
+    return FontMetrics(font_file, advances, advances.get('n', FALLBACK_ADVANCE))
+
+@functools.lru_cache(maxsize=4096)
+def _em_width(text, font_file):
+    """Width of a piece of text in em, memoized since decks repeat words and lines"""
+    metrics = font_metrics(font_file)
+    advances = metrics.advances
+    default = metrics.default_advance
+    return sum(advances.get(char, default) for char in text)
+
+def text_width(text, size, metrics):
+    """Width of a line of text in pixels at a font size"""
+    return _em_width(text, metrics.font_file) * size
+
+def _split_word(word, size, max_width, metrics):
+    """Break a word that is wider than the line at BREAK_AFTER characters"""
+    pieces = [p for p in re.split(f'(?<=[{re.escape(BREAK_AFTER)}])', word) if p]
+    parts, current = [], ''
+    for piece in pieces:
+        if current and text_width(current + piece, size, metrics) > max_width:
+            parts.append(current)
+            current = piece
+        else:
+            current += piece
+    return parts + [current]
+
+def wrap_line(text, size, max_width, metrics):
+    """Greedily wrap a line to max_width, breaking inside words only when needed"""
+    if not text:
+        return ['']
+    space = text_width(' ', size, metrics)
+    lines, current, current_width = [], '', 0.0
+    for word in text.split(' '):
+        word_width = text_width(word, size, metrics)
+        if not current:
+            candidate_width = word_width
+        else:
+            candidate_width = current_width + space + word_width
+        if candidate_width <= max_width:
+            current = f'{current} {word}' if current else word
+            current_width = candidate_width
+            continue
+        if current:
+            lines.append(current)
+        parts = _split_word(word, size, max_width, metrics) if word_width > max_width else [word]
+        lines.extend(parts[:-1])
+        current = parts[-1]
+        current_width = text_width(current, size, metrics)
+    lines.append(current)
+    return lines
+
+def layout_lines(text_lines, width=1920, height=1080, title_size=60, subtitle_size=40,
+                 title_gap=20, subtitle_gap=15, margin=60, region='center', min_scale=0.5,
+                 font_file=None):
+    """Lay out a title and subtitle lines on a canvas
+
+    The first line is the title. Lines are wrapped to the canvas width; if the
+    block is still too tall, every size is scaled down (no further than min_scale)
+    and any single piece that is still too wide is shrunk on its own. The block
+    is centered vertically in the canvas, or anchored to its top or bottom
+    margin for region='top' / 'bottom'. Returns a list of Placements.
+    """
+    metrics = font_metrics(font_file)
+    max_width = width - 2 * margin
+    max_height = height - 2 * margin
+
+    scale = 1.0
+    while True:
+        rows = []
+        for i, line in enumerate(text_lines):
+            role = 'title' if i == 0 else 'subtitle'
+            size = (title_size if i == 0 else subtitle_size) * scale
+            gap = (title_gap if i == 0 else subtitle_gap) * scale
+            for piece in wrap_line(line, size, max_width, metrics):
+                piece_width = text_width(piece, size, metrics)
+                piece_size = size * min(1.0, max_width / piece_width) if piece_width else size
+                rows.append((piece, piece_size, gap, role))
+        block_height = sum(size + gap for _, size, gap, _ in rows) - (rows[-1][2] if rows else 0)
+        if block_height <= max_height or scale <= min_scale:
+            break
+        scale = max(min_scale, scale * 0.9)
+
+    if region == 'top':
+        y = margin
+    elif region == 'bottom':
+        y = height - margin - block_height
+    else:
+        y = (height - block_height) / 2
+
+    placements = []
+    for piece, size, gap, role in rows:
+        size = int(size)
+        x = (width - text_width(piece, size, metrics)) / 2
+        placements.append(Placement(piece, int(x), int(y), size, role))
+        y += size + gap
+    return placements
+
+def drawtext_font_option(font_file=None):
+    """drawtext option that pins the font file, so ffmpeg skips its own font lookup"""
+    font_file = resolve_font(font_file)
+    if font_file is None:
+        return ''
+    escaped = font_file.replace('\\', '/').replace(':', '\\:').replace("'", "\\'")
+    return f"fontfile='{escaped}':"
+
+def _jpeg_size(f):
+    """Return (width, height) from the first JPEG start-of-frame segment, or None"""
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        if marker[1] in (0x01, 0xFF) or 0xD0 <= marker[1] <= 0xD7:
+            # Standalone markers and fill bytes carry no length
+            f.seek(-1 if marker[1] == 0xFF else 0, os.SEEK_CUR)
+            continue
+        length = f.read(2)
+        if len(length) < 2:
+            return None
+        # SOF0-SOF15, except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack('>HH', data[1:5])
+            return width, height
+        f.seek(struct.unpack('>H', length)[0] - 2, os.SEEK_CUR)
+
+def image_size(image_file):
+    """Return (width, height) of an image
+
+    PNG and JPEG sizes are read from the file header; other formats are
+    probed with ffprobe. Raises ValueError if the size cannot be determined.
+    """
+    with open(image_file, 'rb') as f:
+        header = f.read(24)
+        if header[:8] == b'\x89PNG\r\n\x1a\n':
+            return struct.unpack('>II', header[16:24])
+        if header[:2] == b'\xff\xd8':
+            size = _jpeg_size(f)
+            if size:
+                return size
+    cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'stream=width,height',
+           '-of', 'csv=p=0', image_file]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True)
+    except OSError as e:
+        raise ValueError(f"Cannot measure {image_file}: {e}")
+    fields = result.stdout.strip().split(',')
+    if result.returncode != 0 or len(fields) != 2 or not all(field.isdigit() for field in fields):
+        raise ValueError(f"Cannot measure {image_file}: {result.stderr.strip() or 'no video stream'}")
+    return int(fields[0]), int(fields[1])
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Size-budget encoding for demo videos
+Picks the lowest CRF whose predicted output fits a target size or bitrate by
+bisecting on a few sampled slides, so only the final encode runs on the whole deck
+"""
+
+import os
+import re
+import tempfile
+
+import resource_governor
+import video_segments
+
+MIN_CRF = 18
+MAX_CRF = 40
+SAMPLE_SLIDES = 3
+# MP4 header and index overhead on top of the encoded frames
+CONTAINER_OVERHEAD = 1.02
+
+_SIZE_UNITS = {'': 1, 'k': 1000, 'm': 1000 ** 2, 'g': 1000 ** 3}
+
+def parse_size(text):
+    """Parse a size such as '5M', '800k' or '1200000' into a number"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([kKmMgG]?)[bB]?\s*', text)
+    if not match:
+        raise ValueError(f"Invalid size: {text}")
+    return float(match.group(1)) * _SIZE_UNITS[match.group(2).lower()]
+
+def budget_bytes(total_duration, target_size=None, target_bitrate=None):
+    """Convert a target size (bytes) or bitrate (bits/s) into a byte budget"""
+    if target_size:
+        return parse_size(target_size)
+    return parse_size(target_bitrate) * total_duration / 8
+
+def sample_slides(image_files, count=SAMPLE_SLIDES):
+    """Pick evenly spaced slides as sample windows for the deck"""
+    if len(image_files) <= count:
+        return list(image_files)
+    step = (len(image_files) - 1) / (count - 1)
+    return [image_files[round(i * step)] for i in range(count)]
+
+def encode_sample(image_file, crf, fps, duration):
+    """Encode one slide's window at a CRF and return its size in bytes"""
+    fd, sample_file = tempfile.mkstemp(suffix='.mp4')
+    os.close(fd)
+    cmd = [
+        'ffmpeg',
+        '-y',
+        '-loop', '1',
+        '-framerate', str(fps),
+        '-t', str(duration),
+        '-i', image_file,
+        '-vf', video_segments.SCALE_FILTER,
+        '-pix_fmt', 'yuv420p',
+        '-c:v', 'libx264',
+        '-preset', 'medium',
+        '-crf', str(crf),
+        sample_file
+    ]
+    try:
+        result = resource_governor.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"Error encoding sample for {image_file}: {result.stderr}")
+            return None
+        return os.path.getsize(sample_file)
+    finally:
+        os.remove(sample_file)
+
+def predict_size(image_files, samples, crf, fps, duration, cache):
+    """Predict the full deck size at a CRF from the sampled slides"""
+    missing = [img for img in samples if (img, crf) not in cache]
+    sizes = resource_governor.map_jobs(lambda img: encode_sample(img, crf, fps, duration), missing)
+    cache.update(((img, crf), size) for img, size in zip(missing, sizes))
+    sizes = [cache[(img, crf)] for img in samples]
+    if None in sizes:
+        return None
+    return sum(sizes) / len(sizes) * len(image_files) * CONTAINER_OVERHEAD
+
+def choose_crf(image_files, target_bytes, fps=1, duration=8):
+    """Bisect for the lowest CRF whose predicted size fits the budget
+
+    Returns (crf, predicted_bytes), or (None, None) if sampling failed.
+    """
+    existing_files = [f for f in image_files if os.path.exists(f)]
+    if not existing_files:
+        print("Error: No image files found")
+        return None, None
+
+    samples = sample_slides(existing_files)
+    cache = {}
+
+    def predicted(crf):
+        return predict_size(existing_files, samples, crf, fps, duration, cache)
+
+    # Size falls as CRF rises, so check the ends before bisecting the range between them
+    best_size = predicted(MIN_CRF)
+    if best_size is None:
+        return None, None
+    if best_size <= target_bytes:
+        return MIN_CRF, best_size
+    worst_size = predicted(MAX_CRF)
+    if worst_size is None:
+        return None, None
+    if worst_size > target_bytes:
+        print(f"Warning: budget of {target_bytes / 1024 / 1024:.2f} MB is below the "
+              f"smallest predicted size; using CRF {MAX_CRF}")
+        return MAX_CRF, worst_size
+
+    low, high, high_size = MIN_CRF, MAX_CRF, worst_size
+    while high - low > 1:
+        mid = (low + high) // 2
+        size = predicted(mid)
+        if size is None:
+            return None, None
+        if size <= target_bytes:
+            high, high_size = mid, size
+        else:
+            low = mid
+    print(f"  Sampled {len(samples)} slide(s) at {len({crf for _, crf in cache})} CRF value(s)")
+    return high, high_size
+
+def report(predicted_bytes, output_video, target_bytes):
+    """Print predicted vs actual size for a budgeted encode"""
+    actual = os.path.getsize(output_video)
+    error = (actual - predicted_bytes) / predicted_bytes * 100
+    print(f"Budget: {target_bytes / 1024 / 1024:.2f} MB, "
+          f"predicted: {predicted_bytes / 1024 / 1024:.2f} MB, "
+          f"actual: {actual / 1024 / 1024:.2f} MB ({error:+.1f}%)")
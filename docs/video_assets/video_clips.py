@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Screen recordings as slides
+Emulator screenrecord clips are normalized once to the deck's resolution, frame
+rate and encoder settings with a keyframe every second, and cached. Trimming a
+clip then stream-copies the whole GOPs between the cut points and re-encodes
+only the partial GOPs at either end, so every piece joins the still slides'
+segments with stream copy and a trim edit costs about a second of encoding.
+"""
+
+import os
+import subprocess
+from collections import namedtuple
+
+import resource_governor
+import video_determinism
+import video_segments
+import video_transitions
+
+CLIP_CACHE_DIR = os.path.join(video_segments.SEGMENT_CACHE_DIR, 'clips')
+# Decks with clips run at the transition frame rate, since 1 fps cannot show motion
+CLIP_FPS = video_transitions.TRANSITION_FPS
+KEYFRAME_INTERVAL = 1.0
+
+# A recording trimmed to [start, end) seconds; end None means the end of the recording
+Clip = namedtuple('Clip', ['video', 'start', 'end'])
+
+def _cache_path(key_source, extension, cache_dir):
+    return os.path.join(cache_dir, f"{video_segments.cache_key(key_source)}{extension}")
+
+def _probe(video_file, *args):
+    """Run ffprobe on the first video stream and return its output lines"""
+    cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', *args, '-of', 'csv=p=0', video_file]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"Error probing {video_file}: {result.stderr}")
+        return None
+    return [line.strip().rstrip(',') for line in result.stdout.splitlines() if line.strip()]
+
+def clip_length(video_file):
+    """Duration of a video file in seconds"""
+    lines = _probe(video_file, '-show_entries', 'format=duration')
+    return float(lines[0]) if lines else None
+
+def keyframe_times(video_file):
+    """Presentation times of the keyframes in a video, read from packet flags without decoding"""
+    lines = _probe(video_file, '-show_entries', 'packet=pts_time,flags')
+    if lines is None:
+        return None
+    times = []
+    for line in lines:
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            times.append(float(pts_time))
+    return sorted(times)
+
+def normalize_args(fps):
+    """Filter and encoder arguments that make a clip match the deck's segments"""
+    return [
+        '-vf', f"{video_segments.SCALE_FILTER},fps={fps},format=yuv420p",
+        *video_segments.segment_encode_args(),
+    ]
+
+def normalize_clip(video_file, normalized_file, fps=CLIP_FPS):
+    """Re-encode a recording to the deck's size, frame rate and keyframe interval"""
+    cmd = [
+        'ffmpeg',
+        '-y',
+        '-i', video_file,
+        '-an',
+        *normalize_args(fps),
+        # Regular keyframes are the points a trim can stream-copy from
+        '-force_key_frames', f'expr:gte(t,n_forced*{KEYFRAME_INTERVAL})',
+        *video_determinism.muxer_args(),
+        '-f', 'mp4',
+        normalized_file
+    ]
+    result = resource_governor.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"Error normalizing clip {video_file}: {result.stderr}")
+        return False
+    return True
+
+def get_normalized_clip(video_file, fps=CLIP_FPS, cache_dir=CLIP_CACHE_DIR):
+    """Return the cached deck-normalized copy of a recording, encoding it only if missing"""
+    os.makedirs(cache_dir, exist_ok=True)
+    key_source = f"{video_segments.file_digest(video_file)}:{normalize_args(fps)}:{KEYFRAME_INTERVAL}"
+    return video_segments.cached_file(_cache_path(key_source, '.mp4', cache_dir),
+                                      lambda tmp_file: normalize_clip(video_file, tmp_file, fps))
+
+def plan_cuts(keyframes, start, end, fps):
+    """Split [start, end) into (start, end, stream_copy) pieces at the keyframes inside it"""
+    frame = 1 / fps
+    inside = [k for k in keyframes if start - frame / 2 <= k <= end]
+    if len(inside) < 2:
+        return [(start, end, False)]
+    first, last = inside[0], inside[-1]
+    pieces = []
+    if first - start >= frame / 2:
+        pieces.append((start, first, False))
+    pieces.append((first, last, True))
+    if end - last >= frame / 2:
+        pieces.append((last, end, False))
+    return pieces
+
+def encode_piece(normalized_file, segment_file, start, length, fps, stream_copy):
+    """Cut one piece of a normalized clip into an MPEG-TS segment"""
+    if stream_copy:
+        # Stop half a frame early so the keyframe that ends the piece is left out
+        codec_args = ['-t', f'{length - 0.5 / fps:.6f}', '-c:v', 'copy']
+    else:
+        codec_args = ['-t', f'{length:.6f}', *normalize_args(fps)]
+    cmd = [
+        'ffmpeg',
+        '-y',
+        '-ss', f'{start:.6f}',
+        '-i', normalized_file,
+        '-an',
+        *codec_args,
+        *video_determinism.muxer_args(),
+        '-f', 'mpegts',
+        segment_file
+    ]
+    result = resource_governor.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"Error cutting clip {normalized_file} at {start:.3f}s: {result.stderr}")
+        if os.path.exists(segment_file):
+            os.remove(segment_file)
+        return False
+    return True
+
+def get_piece(normalized_file, start, length, fps, stream_copy, cache_dir=CLIP_CACHE_DIR):
+    """Return the cached segment for one piece of a clip, cutting it only if missing"""
+    key_source = (f"{os.path.basename(normalized_file)}:{start:.6f}:{length:.6f}:{fps}:"
+                  f"{stream_copy}:{video_segments.segment_encode_args()}")
+    return video_segments.cached_file(
+        _cache_path(key_source, '.ts', cache_dir),
+        lambda tmp_file: encode_piece(normalized_file, tmp_file, start, length, fps, stream_copy))
+
+def prepare_clip(clip, fps=CLIP_FPS, cache_dir=CLIP_CACHE_DIR):
+    """Normalize a clip and resolve its trim points
+
+    Returns (normalized_file, start, end, keyframes), or None on error.
+    """
+    normalized_file = get_normalized_clip(clip.video, fps, cache_dir)
+    if normalized_file is None:
+        return None
+    length = clip_length(normalized_file)
+    keyframes = keyframe_times(normalized_file)
+    if length is None or keyframes is None:
+        return None
+    start = max(0.0, clip.start or 0.0)
+    end = min(length, clip.end) if clip.end is not None else length
+    if end - start < 1 / fps:
+        print(f"Error: {clip.video} has nothing between {start}s and {end}s")
+        return None
+    return normalized_file, start, end, keyframes
+
+def get_clip_segments(prepared, fps=CLIP_FPS, cache_dir=CLIP_CACHE_DIR):
+    """Return the segments of a prepared clip, or None on error"""
+    normalized_file, start, end, keyframes = prepared
+    pieces = plan_cuts(keyframes, start, end, fps)
+    segment_files = resource_governor.map_jobs(
+        lambda piece: get_piece(normalized_file, piece[0], piece[1] - piece[0], fps, piece[2], cache_dir),
+        pieces)
+    if None in segment_files:
+        return None
+    reencoded = sum(b - a for a, b, copy in pieces if not copy)
+    print(f"  Clip: {end - start:.1f}s, {reencoded:.1f}s re-encoded at the cuts")
+    return segment_files
+
+def create_video_from_items(items, output_video, fps=CLIP_FPS, duration=8):
+    """Create an MP4 from slide images and Clips, joined with stream copy
+
+    Images are shown for duration seconds; clips for their trimmed length.
+    Returns the list of per-item durations, or None on error.
+    """
+    clips = [item for item in items if isinstance(item, Clip)]
+    prepared = dict(zip(clips, resource_governor.map_jobs(lambda clip: prepare_clip(clip, fps), clips)))
+    if None in prepared.values():
+        return None
+
+    durations = [prepared[item][2] - prepared[item][1] if isinstance(item, Clip) else duration
+                 for item in items]
+
+    # Segments do not depend on their place in the timeline, so all items can be cut in parallel
+    def item_segments(item):
+        if isinstance(item, Clip):
+            return get_clip_segments(prepared[item], fps)
+        segment = video_segments.get_slide_segment(item, duration, fps)
+        return [segment] if segment else None
+
+    segment_lists = resource_governor.map_jobs(item_segments, items)
+    if None in segment_lists:
+        return None
+    segment_files = [segment for segments in segment_lists for segment in segments]
+    if not video_segments.concat_segments(segment_files, output_video):
+        return None
+    return durations
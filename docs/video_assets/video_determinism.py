@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Bit-reproducible video output
+When enabled, every encode and mux pins bitexact flags, strips metadata and
+fixes thread/slice settings, so identical decks produce byte-identical files
+whose content hash can be compared to skip republishing unchanged videos
+"""
+
+import hashlib
+import os
+
+# Single-threaded, single-slice x264 removes the thread-dependent output differences
+ENCODER_ARGS = ['-flags:v', '+bitexact', '-threads', '1', '-x264-params', 'slices=1:sliced-threads=0']
+# Drops the Lavf version tag, creation times and any metadata copied from inputs
+MUXER_ARGS = ['-fflags', '+bitexact', '-map_metadata', '-1']
+
+enabled = False
+
+def enable():
+    """Turn on deterministic encoding for the rest of the run"""
+    global enabled
+    enabled = True
+
+def encoder_args():
+    """Extra encoder arguments for the current mode"""
+    return list(ENCODER_ARGS) if enabled else []
+
+def muxer_args():
+    """Extra muxer arguments for the current mode"""
+    return list(MUXER_ARGS) if enabled else []
+
+def content_hash(path):
+    """Return the sha256 of a video file, or of every file in an output directory"""
+    digest = hashlib.sha256()
+    if os.path.isdir(path):
+        # Sorted so the hash does not depend on directory listing order
+        for name in sorted(os.listdir(path)):
+            file_path = os.path.join(path, name)
+            if os.path.isfile(file_path) and not name.endswith('.sha256'):
+                digest.update(name.encode() + b'\0')
+                digest.update(content_hash(file_path).encode())
+        return digest.hexdigest()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def hash_file_for(path):
+    """Path of the sidecar that records the content hash of an output"""
+    if os.path.isdir(path):
+        return os.path.join(path, 'content.sha256')
+    return path + '.sha256'
+
+def record_content_hash(path):
+    """Write the output's content hash and report whether it changed
+
+    Returns (digest, changed); changed is True when there was no previous hash.
+    """
+    digest = content_hash(path)
+    sidecar = hash_file_for(path)
+    previous = None
+    if os.path.exists(sidecar):
+        with open(sidecar) as f:
+            fields = f.read().split()
+            previous = fields[0] if fields else None
+    with open(sidecar, 'w') as f:
+        f.write(f"{digest}  {os.path.basename(path)}\n")
+    return digest, digest != previous
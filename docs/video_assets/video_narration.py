@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Offline narration for demo videos
+Each slide's text lines are spoken by a local TTS engine (espeak-ng), cached by
+text and voice, fitted to the slide's duration and muxed in as an AAC track
+while the video is stream-copied, so editing one slide's text re-synthesizes
+only that slide's clip
+"""
+
+import os
+import shutil
+import wave
+
+import resource_governor
+import video_determinism
+import video_segments
+
+NARRATION_CACHE_DIR = os.path.join(video_segments.SEGMENT_CACHE_DIR, 'narration')
+DEFAULT_VOICE = 'en-us'
+TTS_ENGINES = ['espeak-ng', 'espeak']
+AUDIO_RATE = 48000
+AUDIO_BITRATE = 96000
+AUDIO_ENCODE_ARGS = ['-c:a', 'aac', '-b:a', str(AUDIO_BITRATE), '-ar', str(AUDIO_RATE), '-ac', '1']
+
+def tts_engine():
+    """Return the first TTS engine found on PATH, or None"""
+    for engine in TTS_ENGINES:
+        if shutil.which(engine):
+            return engine
+    return None
+
+def narration_text(lines):
+    """Turn a slide's text lines into sentences for the TTS engine"""
+    sentences = []
+    for line in lines:
+        line = line.strip()
+        if line:
+            sentences.append(line if line[-1] in '.!?:' else line + '.')
+    return ' '.join(sentences)
+
+def audio_bytes(total_duration):
+    """Expected size of the narration track, for size budgets"""
+    return AUDIO_BITRATE * total_duration / 8
+
+def clip_duration(wav_file):
+    """Length of a WAV file in seconds"""
+    with wave.open(wav_file) as f:
+        return f.getnframes() / f.getframerate()
+
+def synthesize(text, voice, engine, wav_file):
+    """Speak text in voice into a WAV file"""
+    # Text goes in on stdin so lines starting with '-' are not read as options
+    cmd = [engine, '-v', voice, '-w', wav_file, '--stdin']
+    result = resource_governor.run(cmd, input=text, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"Error synthesizing narration with {engine}: {result.stderr}")
+        return False
+    return True
+
+def get_narration_clip(text, voice=DEFAULT_VOICE, cache_dir=NARRATION_CACHE_DIR):
+    """Return a cached WAV of text spoken in voice, synthesizing it if needed"""
+    os.makedirs(cache_dir, exist_ok=True)
+    engine = tts_engine()
+    key = video_segments.cache_key(f"{engine}:{voice}:{text}")
+    return video_segments.cached_file(os.path.join(cache_dir, f"{key}.wav"),
+                                      lambda tmp_file: synthesize(text, voice, engine, tmp_file))
+
+def narration_filter(clips, durations):
+    """filter_complex that pads or trims each clip to its slide's duration and joins them"""
+    parts = []
+    for i, duration in enumerate(durations):
+        parts.append(f"[{i + 1}:a]aresample={AUDIO_RATE},apad,atrim=end={duration},"
+                     f"asetpts=PTS-STARTPTS[a{i}]")
+    inputs = ''.join(f'[a{i}]' for i in range(len(clips)))
+    parts.append(f"{inputs}concat=n={len(clips)}:v=0:a=1[narration]")
+    return ';'.join(parts)
+
+def add_narration(video_file, slide_texts, duration=8, voice=DEFAULT_VOICE, language='eng',
+                  extra_args=()):
+    """Mux per-slide narration into a video in place as an AAC track
+
+    slide_texts holds one string per slide, in order; slides with no text are
+    silent. duration is the length of every slide, or a list with one length
+    per slide. The video and any subtitle tracks are stream-copied.
+    """
+    if tts_engine() is None:
+        print(f"Error: no TTS engine found (tried {', '.join(TTS_ENGINES)})")
+        return False
+
+    clips = resource_governor.map_jobs(
+        lambda text: get_narration_clip(text, voice) if text else '', slide_texts)
+    if None in clips:
+        return False
+    durations = list(duration) if isinstance(duration, (list, tuple)) else [duration] * len(clips)
+    for i, (clip, duration) in enumerate(zip(clips, durations), 1):
+        if clip and clip_duration(clip) > duration:
+            print(f"Warning: narration for slide {i} runs {clip_duration(clip):.1f}s, "
+                  f"trimmed to {duration}s")
+
+    cmd = ['ffmpeg', '-y', '-i', video_file]
+    for clip, duration in zip(clips, durations):
+        if clip:
+            cmd += ['-i', clip]
+        else:
+            cmd += ['-f', 'lavfi', '-t', str(duration), '-i', f'anullsrc=r={AUDIO_RATE}:cl=mono']
+    tmp_file = video_file + '.narration.mp4'
+    cmd += [
+        '-filter_complex', narration_filter(clips, durations),
+        '-map', '0:v',
+        '-map', '0:s?',
+        '-map', '[narration]',
+        '-c:v', 'copy',
+        '-c:s', 'copy',
+        *AUDIO_ENCODE_ARGS,
+        *(['-flags:a', '+bitexact'] if video_determinism.enabled else []),
+        '-metadata:s:a:0', f'language={language}',
+        *extra_args,
+        *video_determinism.muxer_args(),
+        tmp_file
+    ]
+    result = resource_governor.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"Error muxing narration: {result.stderr}")
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        return False
+    os.replace(tmp_file, video_file)
+    return True
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Poster, thumbnails and seek-preview sprites for demo videos
+All derivatives come from the rendered slide frames in a single ffmpeg pass
+(one decode and downscale per slide), rather than from decoding the finished
+video, and are cached next to the frames by the frames' content
+"""
+
+import os
+import shutil
+
+import resource_governor
+import video_segments
+import video_subtitles
+
+PREVIEW_CACHE_DIR = os.path.join('frames', 'previews')
+THUMB_WIDTH = 320
+THUMB_HEIGHT = 180
+SPRITE_COLUMNS = 5
+JPEG_QUALITY = '3'
+
+def previews_dir_for(output_video):
+    """Where the derivatives of a video (or HLS directory) are published, next to it"""
+    return os.path.splitext(output_video.rstrip('/'))[0] + '_previews'
+
+def preview_key(image_files, duration):
+    """Cache key covering every frame's content and the preview settings"""
+    digests = ':'.join(video_segments.file_digest(img) for img in image_files)
+    return video_segments.cache_key(f"{duration}:{THUMB_WIDTH}x{THUMB_HEIGHT}:{SPRITE_COLUMNS}:{JPEG_QUALITY}:"
+                                    f"{digests}")
+
+def preview_filter(count):
+    """filter_complex producing the poster, one thumbnail per slide and the sprite atlas"""
+    rows = (count + SPRITE_COLUMNS - 1) // SPRITE_COLUMNS
+    # Each input can only feed one filter, so the poster's slide is split first
+    parts = ["[0:v]split=2[full0][small0]",
+             f"[full0]{video_segments.SCALE_FILTER},format=yuvj420p[poster]"]
+    for i in range(count):
+        source = '[small0]' if i == 0 else f'[{i}:v]'
+        parts.append(f"{source}scale={THUMB_WIDTH}:{THUMB_HEIGHT}:force_original_aspect_ratio=decrease:flags=area,"
+                     f"pad={THUMB_WIDTH}:{THUMB_HEIGHT}:(ow-iw)/2:(oh-ih)/2:color=black,"
+                     f"setsar=1,format=yuvj420p,split=2[thumb{i}][cell{i}]")
+    cells = ''.join(f'[cell{i}]' for i in range(count))
+    parts.append(f"{cells}concat=n={count}:v=1:a=0,tile={SPRITE_COLUMNS}x{rows}[sprite]")
+    return ';'.join(parts)
+
+def write_sprite_vtt(count, duration, vtt_file, sprite_name='sprite.jpg'):
+    """Write the WebVTT index mapping each slide's time range to its sprite cell"""
+    with open(vtt_file, 'w', encoding='utf-8') as f:
+        f.write('WEBVTT\n\n')
+        for i in range(count):
+            x = (i % SPRITE_COLUMNS) * THUMB_WIDTH
+            y = (i // SPRITE_COLUMNS) * THUMB_HEIGHT
+            f.write(f"{video_subtitles.format_timestamp(i * duration)} --> "
+                    f"{video_subtitles.format_timestamp((i + 1) * duration)}\n")
+            f.write(f"{sprite_name}#xywh={x},{y},{THUMB_WIDTH},{THUMB_HEIGHT}\n\n")
+
+def render_previews(image_files, preview_dir, duration):
+    """Render all derivatives of a deck into preview_dir in one ffmpeg pass"""
+    cmd = ['ffmpeg', '-y']
+    for img in image_files:
+        cmd += ['-i', img]
+    cmd += ['-filter_complex', preview_filter(len(image_files))]
+    cmd += ['-map', '[poster]', '-frames:v', '1', '-q:v', JPEG_QUALITY,
+            os.path.join(preview_dir, 'poster.jpg')]
+    for i in range(len(image_files)):
+        cmd += ['-map', f'[thumb{i}]', '-frames:v', '1', '-q:v', JPEG_QUALITY,
+                os.path.join(preview_dir, f'thumb_{i + 1:02d}.jpg')]
+    cmd += ['-map', '[sprite]', '-frames:v', '1', '-q:v', JPEG_QUALITY,
+            os.path.join(preview_dir, 'sprite.jpg')]
+    result = resource_governor.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"Error rendering previews: {result.stderr}")
+        return False
+    write_sprite_vtt(len(image_files), duration, os.path.join(preview_dir, 'sprite.vtt'))
+    return True
+
+def create_previews(image_files, output_dir, duration=8, cache_dir=PREVIEW_CACHE_DIR):
+    """Publish the poster, thumbnails and sprite sheet of a deck to output_dir
+
+    Returns the list of published files, or None on error. Unchanged decks are
+    served from the cache without running ffmpeg.
+    """
+    existing_files = [f for f in image_files if os.path.exists(f)]
+    if not existing_files:
+        print("Error: No image files found")
+        return None
+
+    cached_dir = os.path.join(cache_dir, preview_key(existing_files, duration))
+    if os.path.isdir(cached_dir):
+        print("  Previews unchanged, using cache")
+
+    def build(tmp_dir):
+        os.makedirs(tmp_dir, exist_ok=True)
+        return render_previews(existing_files, tmp_dir, duration)
+
+    if video_segments.cached_file(cached_dir, build) is None:
+        return None
+
+    os.makedirs(output_dir, exist_ok=True)
+    # Drop thumbnails of slides the deck no longer has
+    for name in os.listdir(output_dir):
+        if name.startswith('thumb_') and not os.path.exists(os.path.join(cached_dir, name)):
+            os.remove(os.path.join(output_dir, name))
+    published = []
+    for name in sorted(os.listdir(cached_dir)):
+        shutil.copy2(os.path.join(cached_dir, name), os.path.join(output_dir, name))
+        published.append(os.path.join(output_dir, name))
+    return published
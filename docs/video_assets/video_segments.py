@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Per-slide video segments for progressive playback
+Each slide is encoded once into its own cached MPEG-TS segment, which can be
+published as an HLS playlist or remuxed into a fragmented MP4 as it finishes
+"""
+
+import hashlib
+import os
+import shutil
+import subprocess
+import threading
+
+import resource_governor
+import video_determinism
+
+SEGMENT_CACHE_DIR = 'segments'
+SCALE_FILTER = 'scale=1920:1080:force_original_aspect_ratio=decrease,pad=1920:1080:(ow-iw)/2:(oh-ih)/2:color=black'
+FRAGMENTED_MOVFLAGS = '+frag_keyframe+empty_moov+default_base_moof'
+# Every segment must share these so cached segments can be joined with stream copy
+SEGMENT_ENCODE_ARGS = ['-pix_fmt', 'yuv420p', '-c:v', 'libx264', '-preset', 'medium']
+
+def segment_encode_args():
+    """Encoder arguments shared by every segment in the current mode"""
+    return SEGMENT_ENCODE_ARGS + video_determinism.encoder_args()
+
+def file_digest(path):
+    """Return the sha256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def temp_path(path):
+    """Per-thread temporary name for writing a cache entry before moving it into place"""
+    return f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+
+def cache_key(key_source):
+    """Cache entry name for everything that determines its content"""
+    return hashlib.sha256(key_source.encode()).hexdigest()[:32]
+
+def cached_file(path, build):
+    """Return the cache entry at path, building it first if it is missing
+
+    build(tmp_path) writes the entry (a file or a directory) to a per-thread
+    temporary name and returns True on success; only then is it moved into
+    place, so an interrupted or failed build never leaves a bad cache entry.
+    Returns None if the build fails.
+    """
+    if os.path.exists(path):
+        return path
+    tmp_path = temp_path(path)
+    if not build(tmp_path):
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        elif os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+    os.replace(tmp_path, path)
+    return path
+
+def segment_key(image_file, duration, fps, start_time):
+    """Build the cache key for a slide segment from its image and encode settings"""
+    params = f"{duration}:{fps}:{start_time}:{SCALE_FILTER}:{segment_encode_args()}"
+    return cache_key(f"{file_digest(image_file)}:{params}")
+
+def encode_slide_segment(image_file, segment_file, duration=8, fps=1, start_time=0):
+    """Encode a single slide image into an MPEG-TS segment"""
+    # One keyframe per segment and timestamps offset to the slide start, so
+    # segments can be played back to back or concatenated byte for byte
+    cmd = [
+        'ffmpeg',
+        '-y',
+        '-loop', '1',
+        '-framerate', str(fps),
+        '-t', str(duration),
+        '-i', image_file,
+        '-vf', SCALE_FILTER,
+        *segment_encode_args(),
+        *video_determinism.muxer_args(),
+        '-g', str(max(1, int(fps * duration))),
+        '-output_ts_offset', str(start_time),
+        '-f', 'mpegts',
+        segment_file
+    ]
+    result = resource_governor.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"Error encoding segment for {image_file}: {result.stderr}")
+        if os.path.exists(segment_file):
+            os.remove(segment_file)
+        return False
+    return True
+
+def get_slide_segment(image_file, duration=8, fps=1, start_time=0, cache_dir=SEGMENT_CACHE_DIR):
+    """Return the cached segment for a slide, encoding it only if missing
+
+    Only HLS and fragmented MP4 play segments back to back and need their
+    position as start_time. concat_segments rebases timestamps, so segments
+    joined with it use 0 and are shared wherever the slide appears.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    key = segment_key(image_file, duration, fps, start_time)
+    return cached_file(os.path.join(cache_dir, f"{key}.ts"),
+                       lambda tmp_file: encode_slide_segment(image_file, tmp_file, duration, fps, start_time))
+
+def write_hls_playlist(playlist_file, segment_names, durations, finished=False):
+    """Write an HLS playlist listing the segments encoded so far"""
+    target_duration = max(durations) if durations else 1
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:3',
+        f'#EXT-X-TARGETDURATION:{int(target_duration + 0.999)}',
+        '#EXT-X-MEDIA-SEQUENCE:0',
+        '#EXT-X-PLAYLIST-TYPE:EVENT',
+    ]
+    for name, duration in zip(segment_names, durations):
+        lines.append(f'#EXTINF:{duration:.3f},')
+        lines.append(name)
+    if finished:
+        lines.append('#EXT-X-ENDLIST')
+    # Replace atomically so players polling the playlist never see a partial file
+    tmp_file = playlist_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_file, playlist_file)
+
+def create_hls_stream(image_files, output_dir, fps=1, duration=8):
+    """Create an HLS stream whose playlist grows as each slide finishes encoding"""
+    existing_files = [f for f in image_files if os.path.exists(f)]
+
+    if not existing_files:
+        print("Error: No image files found")
+        return False
+
+    os.makedirs(output_dir, exist_ok=True)
+    # Segments of an earlier, longer deck and a stale subtitle rendition would
+    # otherwise be published with this one
+    for name in os.listdir(output_dir):
+        if (name.startswith('segment_') and name.endswith('.ts')) or name.startswith('subtitles.') \
+                or name == 'master.m3u8':
+            os.remove(os.path.join(output_dir, name))
+    playlist_file = os.path.join(output_dir, 'playlist.m3u8')
+    segment_names = []
+    durations = []
+
+    for i, img in enumerate(existing_files):
+        segment_file = get_slide_segment(img, duration, fps, start_time=i * duration)
+        if segment_file is None:
+            return False
+        name = f'segment_{i:03d}.ts'
+        shutil.copyfile(segment_file, os.path.join(output_dir, name))
+        segment_names.append(name)
+        durations.append(duration)
+        write_hls_playlist(playlist_file, segment_names, durations)
+        print(f"  Segment {i + 1}/{len(existing_files)} ready")
+
+    write_hls_playlist(playlist_file, segment_names, durations, finished=True)
+    return True
+
+def create_fragmented_mp4(image_files, output_video, fps=1, duration=8):
+    """Create a fragmented MP4 that is appended to as each slide finishes encoding"""
+    existing_files = [f for f in image_files if os.path.exists(f)]
+
+    if not existing_files:
+        print("Error: No image files found")
+        return False
+
+    # Segments share continuous timestamps, so their bytes can be streamed
+    # straight into a copy-only remuxer that writes one fragment per slide
+    cmd = [
+        'ffmpeg',
+        '-y',
+        '-loglevel', 'error',
+        '-f', 'mpegts',
+        '-i', 'pipe:0',
+        '-c', 'copy',
+        '-movflags', FRAGMENTED_MOVFLAGS,
+        '-flush_packets', '1',
+        *video_determinism.muxer_args(),
+        output_video
+    ]
+    remuxer = resource_governor.popen(cmd, stdin=subprocess.PIPE,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    ok = True
+    for i, img in enumerate(existing_files):
+        segment_file = get_slide_segment(img, duration, fps, start_time=i * duration)
+        if segment_file is None:
+            ok = False
+            break
+        with open(segment_file, 'rb') as f:
+            shutil.copyfileobj(f, remuxer.stdin)
+        remuxer.stdin.flush()
+        print(f"  Fragment {i + 1}/{len(existing_files)} written")
+
+    remuxer.stdin.close()
+    stderr = remuxer.stderr.read().decode(errors='replace')
+    if remuxer.wait() != 0:
+        print(f"FFmpeg error: {stderr}")
+        return False
+    return ok
+
+def concat_segments(segment_files, output_video, extra_args=()):
+    """Join segments into a single MP4 with stream copy"""
+    list_file = output_video + '.segments.txt'
+    with open(list_file, 'w') as f:
+        for segment_file in segment_files:
+            f.write(f"file '{os.path.abspath(segment_file)}'\n")
+
+    cmd = [
+        'ffmpeg',
+        '-y',
+        '-f', 'concat',
+        '-safe', '0',
+        '-i', list_file,
+        '-c', 'copy',
+        *extra_args,
+        *video_determinism.muxer_args(),
+        output_video
+    ]
+    result = resource_governor.run(cmd, capture_output=True, text=True)
+    os.remove(list_file)
+    if result.returncode != 0:
+        print(f"FFmpeg error: {result.stderr}")
+        return False
+    return True
+
+def create_video_from_segments(image_files, output_video, fps=1, duration=8):
+    """Create an MP4 from cached per-slide segments, encoding only slides not seen before"""
+    existing_files = [f for f in image_files if os.path.exists(f)]
+
+    if not existing_files:
+        print("Error: No image files found")
+        return False
+
+    segment_files = resource_governor.map_jobs(
+        lambda img: get_slide_segment(img, duration, fps), existing_files)
+    if None in segment_files:
+        return False
+    return concat_segments(segment_files, output_video)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Soft-subtitle captions for demo videos
+Overlay lines become timed WebVTT cues derived from slide order and duration,
+so localized variants only need their subtitle track muxed in with stream copy
+
+Usage: python video_subtitles.py VIDEO OUTPUT LANG=FILE.vtt [LANG=FILE.vtt ...]
+"""
+
+import os
+import subprocess
+import sys
+
+import resource_governor
+import slide_renderer
+import video_determinism
+import video_segments
+
+def build_cues(image_files, captions, duration=8):
+    """Build (start, end, lines) cues for the captioned slides of a deck"""
+    existing_files = [f for f in image_files if os.path.exists(f)]
+    cues = []
+    for i, img in enumerate(existing_files):
+        lines = [line for line in captions.get(img, []) if line]
+        if lines:
+            cues.append((i * duration, (i + 1) * duration, lines))
+    return cues
+
+def format_timestamp(seconds):
+    """Format seconds as a WebVTT timestamp"""
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}"
+
+def write_webvtt(cues, vtt_file, headers=()):
+    """Write cues to a WebVTT file"""
+    with open(vtt_file, 'w', encoding='utf-8') as f:
+        f.write('WEBVTT\n' + ''.join(f'{header}\n' for header in headers) + '\n')
+        for i, (start, end, lines) in enumerate(cues, 1):
+            f.write(f"{i}\n{format_timestamp(start)} --> {format_timestamp(end)}\n")
+            f.write('\n'.join(lines) + '\n\n')
+
+def subtitle_tracks(video_file):
+    """Return (stream index, language) for each subtitle track already in a video"""
+    cmd = ['ffprobe', '-v', 'error', '-select_streams', 's', '-show_entries',
+           'stream=index:stream_tags=language', '-of', 'csv=p=0', video_file]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"Error probing {video_file}: {result.stderr}")
+        return None
+    tracks = []
+    for line in result.stdout.splitlines():
+        index, _, language = line.strip().partition(',')
+        if index:
+            tracks.append((int(index), language))
+    return tracks
+
+def mux_subtitles(video_file, subtitle_files, output_video, extra_args=()):
+    """Mux WebVTT files into a video as mov_text tracks, stream-copying video and audio
+
+    Subtitle tracks already in the video are kept unless one of subtitle_files
+    replaces their language.
+    """
+    tracks = subtitle_tracks(video_file)
+    if tracks is None:
+        return False
+    kept = [index for index, language in tracks if language not in subtitle_files]
+    cmd = ['ffmpeg', '-y', '-i', video_file]
+    for vtt_file in subtitle_files.values():
+        cmd += ['-i', vtt_file]
+    cmd += ['-map', '0:v', '-map', '0:a?']
+    for index in kept:
+        cmd += ['-map', f'0:{index}']
+    for i in range(len(subtitle_files)):
+        cmd += ['-map', f'{i + 1}:0']
+    cmd += ['-c:v', 'copy', '-c:a', 'copy', '-c:s', 'mov_text']
+    for i, language in enumerate(subtitle_files, len(kept)):
+        cmd += [f'-metadata:s:s:{i}', f'language={language}']
+    cmd += [*extra_args, *video_determinism.muxer_args(), output_video]
+
+    result = resource_governor.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"Error muxing subtitles: {result.stderr}")
+        return False
+    return True
+
+def stream_start(segment_file):
+    """Start time in seconds of an MPEG-TS segment"""
+    cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=start_time', '-of', 'csv=p=0', segment_file]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0 or not result.stdout.strip():
+        print(f"Error probing {segment_file}: {result.stderr}")
+        return None
+    return float(result.stdout.strip())
+
+def add_hls_subtitles(output_dir, cues, duration=8, language='eng', name='English'):
+    """Add a WebVTT subtitle rendition to an HLS stream written by create_hls_stream
+
+    Writes the cues with a subtitle media playlist and a master.m3u8 that
+    offers them alongside playlist.m3u8.
+    """
+    segments = sorted(f for f in os.listdir(output_dir) if f.startswith('segment_') and f.endswith('.ts'))
+    if not segments:
+        print(f"Error: No segments in {output_dir}")
+        return False
+    start = stream_start(os.path.join(output_dir, segments[0]))
+    if start is None:
+        return False
+    total_duration = len(segments) * duration
+
+    vtt_name = f'subtitles.{language}.vtt'
+    # Ties cue times to the video's MPEG-TS clock, which starts after the muxer delay
+    write_webvtt(cues, os.path.join(output_dir, vtt_name),
+                 [f'X-TIMESTAMP-MAP=MPEGTS:{round(start * 90000)},LOCAL:00:00:00.000'])
+
+    subtitle_playlist = f'subtitles.{language}.m3u8'
+    with open(os.path.join(output_dir, subtitle_playlist), 'w') as f:
+        f.write('\n'.join([
+            '#EXTM3U',
+            '#EXT-X-VERSION:3',
+            f'#EXT-X-TARGETDURATION:{int(total_duration + 0.999)}',
+            '#EXT-X-MEDIA-SEQUENCE:0',
+            '#EXT-X-PLAYLIST-TYPE:VOD',
+            f'#EXTINF:{total_duration:.3f},',
+            vtt_name,
+            '#EXT-X-ENDLIST',
+        ]) + '\n')
+
+    # Peak bitrate of any one segment, as the master playlist requires
+    bandwidth = max(int(os.path.getsize(os.path.join(output_dir, segment)) * 8 / duration)
+                    for segment in segments)
+    with open(os.path.join(output_dir, 'master.m3u8'), 'w') as f:
+        f.write('\n'.join([
+            '#EXTM3U',
+            f'#EXT-X-MEDIA:TYPE=SUBTITLES,GROUP-ID="subs",NAME="{name}",LANGUAGE="{language}",'
+            f'DEFAULT=YES,AUTOSELECT=YES,URI="{subtitle_playlist}"',
+            f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},SUBTITLES="subs"',
+            'playlist.m3u8',
+        ]) + '\n')
+    return True
+
+def add_soft_subtitles(video_file, cues, language='eng', extra_args=()):
+    """Write a WebVTT sidecar next to the video and mux it in place as a subtitle track"""
+    vtt_file = os.path.splitext(video_file)[0] + f'.{language}.vtt'
+    write_webvtt(cues, vtt_file)
+    tmp_file = video_file + '.subs.mp4'
+    if not mux_subtitles(video_file, {language: vtt_file}, tmp_file, extra_args):
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        return False
+    os.replace(tmp_file, video_file)
+    return True
+
+def create_burned_video(image_files, output_video, burn_jobs, fps=1, duration=8):
+    """Create a burned-in caption variant of a soft-captioned deck
+
+    burn_jobs maps each captioned slide frame to the slide_renderer job that
+    draws its captions as burn mode would, on the screenshot at its own size.
+    Those frames are rendered, then encoded like any other slide; slides
+    without captions reuse their cached segments.
+    """
+    existing_files = [f for f in image_files if os.path.exists(f)]
+
+    if not existing_files:
+        print("Error: No image files found")
+        return False
+
+    frames = []
+    for img in existing_files:
+        job = burn_jobs.get(img)
+        if job is not None:
+            os.makedirs(os.path.dirname(job.output_file) or '.', exist_ok=True)
+            slide_renderer.submit(job)
+            img = job.output_file
+        frames.append(img)
+    if not slide_renderer.flush():
+        print("Error: Failed to render burned-in caption frames")
+        return False
+
+    segment_files = resource_governor.map_jobs(
+        lambda img: video_segments.get_slide_segment(img, duration, fps), frames)
+    if None in segment_files:
+        return False
+    return video_segments.concat_segments(segment_files, output_video)
+
+def main():
+    if len(sys.argv) < 4:
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(1)
+
+    video_file, output_video = sys.argv[1], sys.argv[2]
+    subtitle_files = dict(arg.split('=', 1) for arg in sys.argv[3:])
+    if not mux_subtitles(video_file, subtitle_files, output_video):
+        sys.exit(1)
+    print(f"[SUCCESS] Muxed {len(subtitle_files)} subtitle track(s) into {output_video}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Slide transitions rendered only at segment boundaries
+Every boundary between two slides gets a short window segment of its own, so
+the static body of each slide stays cached and is joined with stream copy;
+adding or changing a transition re-encodes just that window
+"""
+
+import os
+
+import resource_governor
+import video_determinism
+import video_segments
+
+TRANSITION_CACHE_DIR = os.path.join(video_segments.SEGMENT_CACHE_DIR, 'transitions')
+# A subset of the xfade transitions that read well on slides
+TRANSITIONS = ['fade', 'fadeblack', 'dissolve', 'wipeleft', 'wiperight', 'slideleft', 'slideright', 'smoothleft']
+# Slides are shown at 1 fps elsewhere, which leaves no frames to blend
+TRANSITION_FPS = 25
+
+def still_input(image_file, fps, duration):
+    """Input arguments that loop a still image for a given duration"""
+    return ['-loop', '1', '-framerate', str(fps), '-t', str(duration), '-i', image_file]
+
+def boundary_filter(transition, window, fps):
+    """Build the filtergraph that joins the two halves of a boundary window"""
+    prepare = f"{video_segments.SCALE_FILTER},fps={fps},format=yuv420p,settb=AVTB"
+    if transition is None:
+        # Hard cut: first half from the outgoing slide, second half from the incoming one
+        join = "[a][b]concat=n=2:v=1:a=0[v]"
+    else:
+        join = f"[a][b]xfade=transition={transition}:duration={window}:offset=0[v]"
+    return f"[0:v]{prepare}[a];[1:v]{prepare}[b];{join}"
+
+def encode_boundary_segment(image_a, image_b, segment_file, transition, window, fps):
+    """Encode the window between two slides as a standalone segment"""
+    # A cut shows each slide for half the window; xfade needs both inputs for all of it
+    input_duration = window / 2 if transition is None else window
+    cmd = [
+        'ffmpeg',
+        '-y',
+        *still_input(image_a, fps, input_duration),
+        *still_input(image_b, fps, input_duration),
+        '-filter_complex', boundary_filter(transition, window, fps),
+        '-map', '[v]',
+        *video_segments.segment_encode_args(),
+        *video_determinism.muxer_args(),
+        '-g', str(max(1, int(fps * window))),
+        '-f', 'mpegts',
+        segment_file
+    ]
+    result = resource_governor.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"Error encoding transition {image_a} -> {image_b}: {result.stderr}")
+        if os.path.exists(segment_file):
+            os.remove(segment_file)
+        return False
+    return True
+
+def get_boundary_segment(image_a, image_b, transition, window, fps, cache_dir=TRANSITION_CACHE_DIR):
+    """Return the cached boundary segment between two slides, encoding it only if missing"""
+    os.makedirs(cache_dir, exist_ok=True)
+    key_source = (f"{video_segments.file_digest(image_a)}:{video_segments.file_digest(image_b)}:"
+                  f"{transition}:{window}:{fps}:{video_segments.segment_encode_args()}")
+    return video_segments.cached_file(
+        os.path.join(cache_dir, f"{video_segments.cache_key(key_source)}.ts"),
+        lambda tmp_file: encode_boundary_segment(image_a, image_b, tmp_file, transition, window, fps))
+
+def create_video_with_transitions(image_files, output_video, transitions, fps=TRANSITION_FPS, duration=8,
+                                  window=1.0):
+    """Create a video with a transition (or hard cut, for None) at each slide boundary"""
+    existing_files = [f for f in image_files if os.path.exists(f)]
+
+    if not existing_files:
+        print("Error: No image files found")
+        return False
+    if window >= duration:
+        print("Error: Transition window must be shorter than the slide duration")
+        return False
+    if fps * window < 2:
+        print(f"Warning: {fps} fps leaves fewer than 2 frames per transition window")
+
+    transitions = list(transitions) + [None] * len(existing_files)
+    half = window / 2
+    last = len(existing_files) - 1
+
+    def body_segment(i):
+        # The body excludes the half windows at each boundary, so it does not
+        # depend on which transitions are chosen and stays cached across edits
+        body_duration = duration - (half if i > 0 else 0) - (half if i < last else 0)
+        return video_segments.get_slide_segment(existing_files[i], body_duration, fps)
+
+    def boundary_segment(i):
+        return get_boundary_segment(existing_files[i], existing_files[i + 1], transitions[i],
+                                    window, fps)
+
+    bodies = resource_governor.map_jobs(body_segment, range(last + 1))
+    boundaries = resource_governor.map_jobs(boundary_segment, range(last))
+    if None in bodies or None in boundaries:
+        return False
+
+    segment_files = []
+    for i, body in enumerate(bodies):
+        segment_files.append(body)
+        if i < last:
+            segment_files.append(boundaries[i])
+    return video_segments.concat_segments(segment_files, output_video)